@@ -0,0 +1,4 @@
+"""Address crawl of the company websites: run() crawls a shard, merge_shards() combines the shard results and
+main() is the command line entry point, also run with python -m challenge_1 from the repository root.
+"""
+from .challenge1 import main, run, merge_shards, read_domains
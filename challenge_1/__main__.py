@@ -0,0 +1,3 @@
+from .challenge1 import main
+
+main()
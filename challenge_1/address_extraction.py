@@ -0,0 +1,103 @@
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+import pyap
+import usaddress
+
+from .address_prefilter import parse_windows
+from .text_cleaning import clean_website_content
+
+# Everything in this module is CPU-bound and runs in the worker processes of the crawl pipeline
+
+PARSE_CACHE_SIZE = 50000  # Tagged addresses memoized per process, chains and shared offices repeat across domains
+
+
+def extract_pyap(text):
+    """Extract both US and UK addresses using pyap, parsing only the windows of text around address signals."""
+    if text is None: 
+        return None
+
+    # Unique address strings, US matches first then UK ones
+    extracted_addresses = parse_windows(text, pyap.parse)
+
+    return extracted_addresses if extracted_addresses else None
+
+
+class StructuredAddress(namedtuple('StructuredAddress', ['country', 'state', 'city', 'postcode', 'street', 'number'])):
+    """Tagged components of an address, parsed once by usaddress and carried through validation and output."""
+    __slots__ = ()
+
+    def __repr__(self):
+        # Shown like the plain tuples of earlier reports
+        return repr(tuple(self))
+
+
+def normalize_address_text(text):
+    """Return the memo key of an address text, the same address with different spacing parses once."""
+    return ' '.join(text.split())
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_address(normalized_text):
+    """Tag a normalized address text with usaddress, memoized, or return None if it cannot be tagged."""
+    try:
+        components = usaddress.tag(normalized_text)[0]
+    except Exception as e:
+        print(f"Error extracting address using usaddress: {e}")
+        return None
+    return StructuredAddress(
+        'USA',  # Assuming it's a USA address
+        components.get('StateName', None),  # Region (State)
+        components.get('PlaceName', None),  # City
+        components.get('ZipCode', None),  # Postcode
+        components.get('StreetName', None),  # Road
+        components.get('AddressNumber', None)  # Road number
+    )
+
+
+def extract_usaddress(text):
+    """Extract addresses using the usaddress library."""
+    if text is None:
+        return None
+
+    usaddress_result = parse_address(normalize_address_text(text))
+    # Check if all components are not None
+    if usaddress_result is not None and all(component is not None for component in usaddress_result):
+        return usaddress_result
+    return None
+
+
+def parse_address_for_geopy(address):
+    """Format an address for geopy from its tagged components, tagging it first if given as text."""
+    if isinstance(address, str):
+        address = parse_address(normalize_address_text(address))
+    if address is None:
+        return None
+    country, state, city, postcode, street, number = address
+    return "{}, {}, {}, {}".format(number or '', street or '', city or '', state or '')
+
+
+def extract_addresses(page_texts):
+    """Extract the addresses of a list of page texts.
+
+    Returns the pyap hits, the usaddress tuples and the seconds spent cleaning, in pyap and in usaddress.
+    """
+    start = time.perf_counter()
+    # Clean the website content
+    cleaned_content = clean_website_content(page_texts)
+    cleaned = time.perf_counter()
+
+    # Extract addresses using various methods
+    usaddress_results = []
+    pyap_results = extract_pyap(cleaned_content)
+    parsed = time.perf_counter()
+    if pyap_results:
+        for address in pyap_results:
+            usaddress_results.append(extract_usaddress(address))
+
+    # Remove duplicates and the addresses usaddress could not complete
+    usaddress_results = [result for result in set(usaddress_results) if result is not None]
+
+    timings = {'clean': cleaned - start, 'pyap': parsed - cleaned, 'usaddress': time.perf_counter() - parsed}
+    return pyap_results, usaddress_results, timings
@@ -0,0 +1,74 @@
+import re
+
+WINDOW_BEFORE = 200  # Characters kept before an address signal, the street part comes before ZIP and state
+WINDOW_AFTER = 120  # Characters kept after an address signal, city, state and ZIP follow the street
+MAX_WINDOW = 2000  # Longest window handed to pyap, longer merged runs are cut into overlapping pieces
+
+US_STATES = ('AL AK AZ AR CA CO CT DE DC FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO MT NE NV NH NJ NM NY NC '
+             'ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY PR').split()
+US_STATE_NAMES = ('Alabama|Alaska|Arizona|Arkansas|California|Colorado|Connecticut|Delaware|Florida|Georgia|Hawaii|'
+                  'Idaho|Illinois|Indiana|Iowa|Kansas|Kentucky|Louisiana|Maine|Maryland|Massachusetts|Michigan|'
+                  'Minnesota|Mississippi|Missouri|Montana|Nebraska|Nevada|New Hampshire|New Jersey|New Mexico|'
+                  'New York|North Carolina|North Dakota|Ohio|Oklahoma|Oregon|Pennsylvania|Rhode Island|'
+                  'South Carolina|South Dakota|Tennessee|Texas|Utah|Vermont|Virginia|Washington|West Virginia|'
+                  'Wisconsin|Wyoming')
+STREET_SUFFIXES = ('street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|lane|ln|way|court|ct|circle|cir|place|pl|'
+                   'parkway|pkwy|highway|hwy|suite|ste|square|sq|terrace|trail|trl|plaza|pike|route|close|crescent|'
+                   'gardens|grove|hill|mews|park|row|walk|wharf|yard|house|building|floor|unit|po box|p o box')
+
+# Every cheap signal that an address may be nearby, scanned once over the whole text
+ADDRESS_SIGNALS = re.compile(
+    r'\b\d{5}(?:-\d{4})?\b'  # US ZIP or ZIP+4
+    r'|\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}\b'  # UK postcode
+    r'|\b(?:' + '|'.join(US_STATES) + r')\b'  # US state abbreviation, upper case only
+    r'|\b(?i:' + US_STATE_NAMES + r')\b'
+    r'|\b\d+[A-Za-z]?\s+(?:\S+\s+){0,4}?(?i:' + STREET_SUFFIXES + r')\b'  # House number followed by a street suffix
+)
+
+
+def candidate_windows(text, before=WINDOW_BEFORE, after=WINDOW_AFTER, max_window=MAX_WINDOW):
+    """Return the (start, end) spans of text around address signals, merged where they overlap."""
+    spans = []
+    for match in ADDRESS_SIGNALS.finditer(text):
+        start, end = max(0, match.start() - before), min(len(text), match.end() + after)
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+
+    windows = []
+    for start, end in spans:
+        # Cut long runs into pieces overlapping by a full window, so an address on a cut is whole in one piece
+        step = max_window - (before + after)
+        while end - start > max_window:
+            windows.append((start, start + max_window))
+            start += step
+        windows.append((start, end))
+
+    # Widen to word boundaries so pyap never sees half a word at either edge
+    widened = []
+    for start, end in windows:
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        widened.append((start, end))
+    return widened
+
+
+def parse_windows(text, parse, countries=('US', 'GB')):
+    """Run parse(window, country) over the candidate windows of text and return the unique results in order.
+
+    Results are grouped by country like separate full-text passes would be.
+    """
+    windows = [text[start:end] for start, end in candidate_windows(text)]
+    results = []
+    seen = set()
+    for country in countries:
+        for window in windows:
+            for address in parse(window, country=country):
+                address = str(address)
+                if address not in seen:
+                    seen.add(address)
+                    results.append(address)
+    return results
@@ -0,0 +1,100 @@
+import ast
+import glob
+import random
+import re
+import string
+import sys
+import time
+
+import pandas as pd
+import pyap
+
+from .address_prefilter import candidate_windows, parse_windows
+from .text_cleaning import clean_website_content
+
+RESULT_FILES = './challenge_1/results_*.xlsx'  # Earlier reports, some keep the raw pyap hits in a 'PyAP' column
+FILLER_WORDS = 2000  # Words of site-like filler around each domain's stored addresses
+SAMPLE_DOMAINS = 100  # Domains compared, the full-text path takes about a second per domain
+
+# Hits carrying a US ZIP or UK postcode, to tell real addresses from pyap's GB false positives
+POSTAL_CODE = re.compile(r'\b\d{5}(?:-\d{4})?\b|\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}\b')
+
+
+def extract_pyap_full_text(text):
+    """Original path, pyap over the whole text."""
+    return [str(address) for country in ('US', 'GB') for address in pyap.parse(text, country=country)]
+
+
+def load_stored_hits(pattern=RESULT_FILES):
+    """Return domain -> pyap hits stored in the 'PyAP' column of earlier result files."""
+    hits = {}
+    for path in sorted(glob.glob(pattern)):
+        df = pd.read_excel(path)
+        if 'PyAP' not in df.columns:
+            continue
+        for domain, value in zip(df['Domain'], df['PyAP']):
+            if not (isinstance(value, str) and value.startswith('[')):
+                continue
+            try:
+                hits.setdefault(domain, set()).update(ast.literal_eval(value))
+            except (ValueError, SyntaxError):
+                pass  # Excel cuts cells at 32767 characters, long hit lists are unreadable
+
+    return hits
+
+
+def make_site_text(addresses, rng):
+    """Build cleaned site-like text with the addresses scattered through filler words."""
+    words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10)))
+             for _ in range(FILLER_WORDS)]
+    for address in addresses:
+        words.insert(rng.randrange(len(words)), address)
+    return clean_website_content(' '.join(words))
+
+
+def evaluate(site_texts):
+    """Compare the windowed path with the full-text path over the site texts and print recall and timings."""
+    full_time = windowed_time = 0.0
+    full_total = found_total = 0
+    postal_total = postal_found = 0
+    window_chars = text_chars = 0
+    missed = []
+    for domain, text in site_texts.items():
+        start = time.perf_counter()
+        full = set(extract_pyap_full_text(text))
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        windowed = set(parse_windows(text, pyap.parse))
+        windowed_time += time.perf_counter() - start
+
+        full_total += len(full)
+        found_total += len(full & windowed)
+        postal = {address for address in full if POSTAL_CODE.search(address)}
+        postal_total += len(postal)
+        postal_found += len(postal & windowed)
+        missed.extend((domain, address) for address in full - windowed)
+        text_chars += len(text)
+        window_chars += sum(end - start for start, end in candidate_windows(text))
+
+    recall = found_total / full_total if full_total else 1.0
+    print(f"Domains: {len(site_texts)}, characters parsed: {window_chars:,} of {text_chars:,} "
+          f"({window_chars / max(text_chars, 1):.1%})")
+    print(f"Full-text pyap: {full_time:.2f} s, windowed pyap: {windowed_time:.2f} s "
+          f"({full_time / max(windowed_time, 1e-9):.1f}x faster)")
+    print(f"Recall against the full-text path: {found_total}/{full_total} ({recall:.2%})")
+    print(f"Recall on hits with a ZIP or postcode: {postal_found}/{postal_total} "
+          f"({postal_found / max(postal_total, 1):.2%})")
+    for domain, address in missed[:10]:
+        print(f"  missed on {domain}: {address!r}")
+    return recall
+
+
+if __name__ == "__main__":
+    # python -m challenge_1.bench_address_prefilter [sample size] [result files glob]
+    rng = random.Random(42)
+    sample_size = int(sys.argv[1]) if len(sys.argv) > 1 else SAMPLE_DOMAINS
+    stored_hits = load_stored_hits(sys.argv[2] if len(sys.argv) > 2 else RESULT_FILES)
+    domains = rng.sample(sorted(stored_hits), min(sample_size, len(stored_hits)))
+    site_texts = {domain: make_site_text(sorted(stored_hits[domain]), rng) for domain in domains}
+    evaluate(site_texts)
@@ -0,0 +1,321 @@
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import pandas as pd
+from aiohttp import web
+from aiohttp.abc import AbstractResolver
+
+from . import challenge1, crawl_engine
+from .address_extraction import extract_addresses
+from .crawl_metrics import CrawlMetrics
+from .geocode_cache import GeocodingService, GeocodeCache, StubGeocoder
+from .http_client import HttpClient
+from .pipeline import StagedPipeline
+from .postal_index import load_postal_index
+
+SAMPLE_DOMAINS = 200  # Domains of the website list crawled by one benchmark run
+REGRESSION_TOLERANCE = 0.2  # Share of throughput that may be lost against the baseline before failing
+RECALL_TOLERANCE = 0.01  # Recall that may be lost against the baseline before failing
+
+# Kind of synthetic host and its weight among the domains
+SITE_KINDS = [('normal', 70), ('slow', 8), ('redirect', 10), ('flaky', 6), ('error', 6)]
+SLOW_DELAY = (0.2, 1.0)  # Seconds a slow host waits before each answer
+FLAKY_ERROR_RATE = 0.3  # Share of the subpages of a flaky host answering 500
+PAGES_PER_SITE = (3, 40)
+LINKS_PER_PAGE = (5, 30)
+PARAGRAPHS_PER_PAGE = (2, 25)
+
+US_STREETS = ['Main Street', 'Oak Avenue', 'Maple Drive', 'Cedar Lane', 'Elm Road', 'Park Boulevard', 'Lake Court',
+              'Hill Street', 'Washington Avenue', 'Pine Drive']
+US_CITIES = [('Springfield', 'IL', '62701'), ('Austin', 'TX', '78701'), ('Denver', 'CO', '80202'),
+             ('Portland', 'OR', '97205'), ('Columbus', 'OH', '43215'), ('Raleigh', 'NC', '27601'),
+             ('Tampa', 'FL', '33602'), ('Boise', 'ID', '83702'), ('Madison', 'WI', '53703'),
+             ('Richmond', 'VA', '23219')]
+# Addresses the postal index cannot settle, so they go to the geocoder: ZIPs newer than the index in a known area
+# and cities not listed under their ZIP
+US_AMBIGUOUS_CITIES = [('Springfield', 'IL', '62799'), ('Tampa', 'FL', '33699'), ('Lakewood', 'CO', '80202'),
+                       ('Round Rock', 'TX', '78701'), ('Fitchburg', 'WI', '53703'), ('Henrico', 'VA', '23219')]
+AMBIGUOUS_SHARE = 0.3  # Share of the US addresses taken from US_AMBIGUOUS_CITIES
+UK_STREETS = ['High Street', 'Station Road', 'Church Lane', 'Victoria Road', 'Mill Lane']
+UK_TOWNS = [('London', 'SW1A 2AA'), ('Manchester', 'M1 1AE'), ('Leeds', 'LS1 4DY'), ('Bristol', 'BS1 5TR'),
+            ('Glasgow', 'G1 1XQ')]
+WORDS = ('quality service team customer solutions project design custom experience local family owned business '
+         'professional support years trusted products industry contact today learn more about our mission values '
+         'community partners clients results excellence innovation reliable affordable').split()
+
+
+class SyntheticSite:
+    """Multi-page website generated from the domain name, the same on every run."""
+
+    def __init__(self, domain):
+        rng = random.Random(zlib.crc32(domain.encode()))
+        self.domain = domain
+        self.kind = rng.choices([kind for kind, _ in SITE_KINDS], [weight for _, weight in SITE_KINDS])[0]
+        self.delay = rng.uniform(*SLOW_DELAY) if self.kind == 'slow' else 0
+
+        # Ground truth, the embedded address and the query the geocoder should be asked for it
+        self.address = self.geocode_query = self.postcode = None
+        roll = rng.random()
+        if roll < 0.65:
+            cities = US_AMBIGUOUS_CITIES if rng.random() < AMBIGUOUS_SHARE else US_CITIES
+            number, street, (city, state, zip_code) = rng.randint(1, 9999), rng.choice(US_STREETS), rng.choice(cities)
+            self.address = f'{number} {street}, {city}, {state} {zip_code}'
+            self.geocode_query = f'{number}, {street.split()[0]}, {city}, {state}'
+            self.postcode = zip_code
+        elif roll < 0.85:
+            number, street, (town, postcode) = rng.randint(1, 300), rng.choice(UK_STREETS), rng.choice(UK_TOWNS)
+            self.address = f'{number} {street}, {town} {postcode}'
+            self.postcode = postcode
+        self.address_in_footer = rng.random() < 0.3
+
+        page_count = rng.randint(*PAGES_PER_SITE)
+        paths = ['/', '/contact', '/about', '/locations'][:page_count]
+        paths += [f'/{rng.choice(["products", "services", "blog", "news"])}/{index}'
+                  for index in range(page_count - len(paths))]
+        self.pages = {}
+        for path in paths:
+            links = rng.sample(paths, min(len(paths), rng.randint(*LINKS_PER_PAGE)))
+            paragraphs = [' '.join(rng.choices(WORDS, k=rng.randint(20, 80)))
+                          for _ in range(rng.randint(*PARAGRAPHS_PER_PAGE))]
+            broken = self.kind == 'flaky' and path != '/' and rng.random() < FLAKY_ERROR_RATE
+            self.pages[path] = (links, paragraphs, broken)
+
+    def render(self, path):
+        """Return the HTML of a page."""
+        links, paragraphs, _ = self.pages[path]
+        body = ''.join(f'<p>{paragraph}</p>' for paragraph in paragraphs)
+        if path == '/contact' and self.address:
+            body += f'<div class="contact"><h2>Visit us</h2><address>{self.address}</address></div>'
+        footer = f'<p>Copyright {self.domain}</p>'
+        if self.address_in_footer and self.address:
+            footer += f'<p>{self.address}</p>'
+        nav = ''.join(f'<li><a href="{link}">{link.strip("/").replace("/", " ") or "home"}</a></li>' for link in links)
+        return (f'<html><head><title>{self.domain}</title><style>p {{margin: 0}}</style></head><body>'
+                f'<header><nav><ul>{nav}</ul></nav></header><main>{body}</main>'
+                f'<footer><a href="/contact">Contact</a> <a href="/about">About</a>{footer}</footer></body></html>')
+
+
+class SiteServer:
+    """Local HTTP server answering for every synthetic site, by Host header, on its own thread and event loop."""
+
+    def __init__(self, sites):
+        self.sites = sites
+        self.port = None
+        self.requests = 0
+        self.pages_served = 0
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.serve()), name='site-server', daemon=True)
+
+    async def handle(self, request):
+        self.requests += 1
+        host = request.host.split(':')[0]
+        site = self.sites.get(host.removeprefix('www.'))
+        if site is None:
+            return web.Response(status=404)
+        if site.delay:
+            await asyncio.sleep(site.delay)
+        if site.kind == 'error':
+            return web.Response(status=500)
+        if site.kind == 'redirect' and not host.startswith('www.'):
+            raise web.HTTPMovedPermanently(f'http://www.{host}{request.path}')
+        if request.path not in site.pages or site.pages[request.path][2]:
+            return web.Response(status=404 if request.path not in site.pages else 500)
+        self.pages_served += 1
+        return web.Response(text=site.render(request.path), content_type='text/html')
+
+    async def serve(self):
+        app = web.Application()
+        app.router.add_route('GET', '/{path:.*}', self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.stopped = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.ready.set()
+        await self.stopped.wait()
+        await runner.cleanup()
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stopped.set)
+        self.thread.join()
+
+
+class LocalResolver(AbstractResolver):
+    """Resolves every host to the local site server."""
+
+    def __init__(self, port):
+        self.port = port
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [{'hostname': host, 'host': '127.0.0.1', 'port': self.port, 'family': socket.AF_INET,
+                 'proto': 0, 'flags': socket.AI_NUMERICHOST}]
+
+    async def close(self):
+        pass
+
+
+class StageTimings:
+    """Latency samples of the crawl stages, gathered by wrapping the stage methods for the length of a run."""
+
+    # (owner, method name, stage name)
+    STAGES = [(HttpClient, 'fetch_status', 'probe'), (HttpClient, 'fetch_page', 'fetch'),
+              (StagedPipeline, 'parse_html', 'parse'), (StagedPipeline, 'analyze', 'extract+validate'),
+              (crawl_engine, 'check_website', 'domain')]
+
+    def __init__(self):
+        self.samples = {stage: [] for _, _, stage in self.STAGES}
+
+    def timed(self, method, stage):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return wrapper
+
+    @contextlib.contextmanager
+    def instrument(self):
+        originals = [(owner, name, getattr(owner, name)) for owner, name, _ in self.STAGES]
+        for (owner, name, stage), (_, _, method) in zip(self.STAGES, originals):
+            setattr(owner, name, self.timed(method, stage))
+        try:
+            yield self
+        finally:
+            for owner, name, method in originals:
+                setattr(owner, name, method)
+
+    def percentiles(self):
+        """Return stage -> {count, p50, p90, p99} in milliseconds."""
+        report = {}
+        for stage, samples in self.samples.items():
+            samples = sorted(samples)
+            if samples:
+                report[stage] = {'count': len(samples), **{
+                    f'p{q}': round(samples[min(len(samples) - 1, int(len(samples) * q / 100))] * 1000, 1)
+                    for q in (50, 90, 99)}}
+        return report
+
+
+def score(sites, results):
+    """Return the extraction and validation recall of the results against the ground truth of the sites."""
+    by_domain = {result['Domain']: result for result in results}
+    reachable = [site for site in sites.values() if site.kind != 'error']
+    with_address = [site for site in reachable if site.address]
+    us_sites = [site for site in with_address if site.geocode_query]
+    found = sum(by_domain[site.domain]['Status'] == 'Reachable' for site in with_address)
+    validated = sum(any(site.postcode in address for address in by_domain[site.domain].get('Validated with GeoPy', ())
+                        if isinstance(address, tuple))
+                    for site in us_sites)
+    false_hits = sum(by_domain[site.domain]['Status'] == 'Reachable' for site in reachable if not site.address)
+    unreachable = sum(by_domain[site.domain]['Status'] == 'Unreachable' for site in sites.values() if site.kind == 'error')
+    return {
+        'extraction_recall': round(found / max(len(with_address), 1), 4),
+        'validation_recall': round(validated / max(len(us_sites), 1), 4),
+        'false_address_sites': false_hits,
+        'error_sites_unreachable': f'{unreachable}/{len(sites) - len(reachable)}',
+    }
+
+
+async def crawl(sites, port, workdir, cpu_workers, metrics):
+    results = []
+    await crawl_engine.crawl_websites(
+        list(sites), extract_addresses, challenge1.validate_addresses, challenge1.build_result, results.append,
+        total=len(sites), pipeline_settings=dict(cpu_workers=cpu_workers), metrics=metrics,
+        resolver=LocalResolver(port), page_cache_dir=None, site_memory_path=os.path.join(workdir, 'site_memory.json'))
+    return results
+
+
+def run_benchmark(domains, cpu_workers=None):
+    """Crawl the synthetic sites of the domains end to end and return the report."""
+    sites = {domain: SyntheticSite(domain) for domain in domains}
+    server = SiteServer(sites)
+    server.start()
+
+    # Nominatim is replaced by a stub knowing every embedded US address, without rate limit
+    geolocator = StubGeocoder({site.geocode_query: (0.0, 0.0) for site in sites.values() if site.geocode_query})
+    with tempfile.TemporaryDirectory() as workdir:
+        challenge1.geocoding_service = GeocodingService(geolocator, GeocodeCache(os.path.join(workdir, 'geocode.sqlite')),
+                                                        min_delay=0)
+        challenge1.postal_index = load_postal_index()
+        timings = StageTimings()
+        metrics = CrawlMetrics(path=None, prometheus_path=None)
+        start = time.perf_counter()
+        with timings.instrument(), open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results = asyncio.run(crawl(sites, server.port, workdir, cpu_workers or os.cpu_count() or 1, metrics))
+        elapsed = time.perf_counter() - start
+        challenge1.geocoding_service.close()
+        challenge1.geocoding_service.cache.close()
+    server.stop()
+
+    return {
+        'domains': len(domains),
+        'seconds': round(elapsed, 2),
+        'domains_per_sec': round(len(domains) / elapsed, 2),
+        'pages_per_sec': round(server.pages_served / elapsed, 2),
+        'pages_served': server.pages_served,
+        'requests': server.requests,
+        'geocoder_calls': geolocator.calls,
+        **(challenge1.postal_index.stats() if challenge1.postal_index else {}),
+        # ru_maxrss is in kilobytes on Linux, children are the extraction processes
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'peak_child_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        'stages_ms': timings.percentiles(),
+        # Time summed over domains, the extraction stages run in the worker processes
+        'stage_seconds_total': {stage: round(seconds, 2) for stage, seconds in sorted(metrics.stages.items())},
+        **score(sites, results),
+    }
+
+
+def compare(report, baseline):
+    """Print the changes against a baseline report and return the regressions."""
+    regressions = []
+    for key in ('domains_per_sec', 'pages_per_sec'):
+        change = report[key] / baseline[key] - 1 if baseline.get(key) else 0
+        print(f"  {key}: {baseline.get(key)} -> {report[key]} ({change:+.1%})")
+        if change < -REGRESSION_TOLERANCE:
+            regressions.append(key)
+    for key in ('extraction_recall', 'validation_recall'):
+        print(f"  {key}: {baseline.get(key)} -> {report[key]}")
+        if report[key] < baseline.get(key, 0) - RECALL_TOLERANCE:
+            regressions.append(key)
+    print(f"  peak_rss_mb: {baseline.get('peak_rss_mb')} -> {report['peak_rss_mb']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    # python -m challenge_1.bench_pipeline [domains] [baseline json], the baseline is written when missing
+    sample_size = int(sys.argv[1]) if len(sys.argv) > 1 else SAMPLE_DOMAINS
+    baseline_path = sys.argv[2] if len(sys.argv) > 2 else None
+    websites = pd.read_parquet(challenge1.websites_path, engine='pyarrow')['domain'].drop_duplicates()
+    domains = websites.sample(min(sample_size, len(websites)), random_state=42).tolist()
+
+    report = run_benchmark(domains)
+    print(json.dumps(report, indent=2))
+
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            print(f"Against {baseline_path}:")
+            regressions = compare(report, json.load(f))
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            sys.exit(1)
+    elif baseline_path:
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
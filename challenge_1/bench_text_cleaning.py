@@ -0,0 +1,70 @@
+import random
+import string
+import timeit
+
+from .text_cleaning import clean_website_content
+
+
+def clean_website_content_reference(text):
+    """Original per-character implementation, kept to check the output and measure the speedup."""
+    if text is None:
+        return text
+    cleaned_text = ' '.join(text.split())
+    cleaned_text = ''.join(c for c in cleaned_text if c.isalnum() or c.isspace() or c in ",.;:!?")
+    return cleaned_text
+
+
+NOISY_ALPHABET = string.ascii_letters + string.digits + string.punctuation + ' \t\n\r\xa0' + 'éßøü中文—©®™_²½'
+SYMBOLS = string.punctuation + '\xa0—©®™•'
+
+
+def make_pages(page_count=40, page_size=50000, noisy=False, seed=42):
+    """Generate page texts with words, addresses, punctuation, symbols and non-ASCII characters.
+
+    Regular pages look like scraped site text, noisy pages are random characters where a third gets dropped.
+    """
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(page_count):
+        words = []
+        size = 0
+        while size < page_size:
+            roll = rng.random()
+            if noisy:
+                word = ''.join(rng.choice(NOISY_ALPHABET) for _ in range(rng.randint(1, 12)))
+            elif roll < 0.05:
+                word = rng.choice(['123 Main St, Springfield, IL 62701.', 'Contact us!', '\n\n\t', 'Café Zürich'])
+            elif roll < 0.15:
+                word = rng.choice(SYMBOLS)
+            else:
+                word = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10)))
+            words.append(word)
+            size += len(word) + 1
+        pages.append(' '.join(words))
+    return pages
+
+
+def benchmark(pages, label, runs=5):
+    """Check the new stage against the original on the pages and print both timings."""
+    joined = ''.join(page + '\n' for page in pages)
+
+    # The new stage must give the same output as the original, from the joined text or the page list
+    expected = clean_website_content_reference(joined)
+    assert clean_website_content(joined) == expected
+    assert clean_website_content(pages) == expected
+
+    reference = timeit.timeit(lambda: clean_website_content_reference(joined), number=runs) / runs
+    from_text = timeit.timeit(lambda: clean_website_content(joined), number=runs) / runs
+    from_pages = timeit.timeit(lambda: clean_website_content(pages), number=runs) / runs
+
+    print(f"{label}: {len(pages)} pages, {len(joined):,} characters, outputs identical")
+    print(f"  Per-character join: {reference * 1000:8.1f} ms")
+    print(f"  New (joined text):  {from_text * 1000:8.1f} ms  ({reference / from_text:.1f}x faster)")
+    print(f"  New (page list):    {from_pages * 1000:8.1f} ms  ({reference / from_pages:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    assert clean_website_content(['', '  ', 'a_b c']) == clean_website_content_reference('\n  \na_b c')
+    assert clean_website_content('\ud800 ok') == clean_website_content_reference('\ud800 ok')
+    benchmark(make_pages(), "Site-like text")
+    benchmark(make_pages(noisy=True), "Noisy text")
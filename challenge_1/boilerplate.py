@@ -0,0 +1,37 @@
+class BoilerplateFilter:
+    """Drops the text blocks of a page that already appeared on an earlier page of the same domain.
+
+    Blocks are the lines of the page text, which html_text.py ends after every block-level element, so the
+    header, footer and navigation repeated on every page are kept once, on the first page that has them.
+    """
+
+    def __init__(self):
+        self.seen_blocks = set()  # Hashes of the whitespace-normalized blocks of earlier pages
+        self.bytes_in = 0  # UTF-8 bytes of all the blocks given to the filter
+        self.bytes_removed = 0  # UTF-8 bytes of the repeated blocks dropped
+
+    def filter(self, page_text):
+        """Return the page text without the blocks seen on earlier pages."""
+        page_blocks = set()
+        kept = []
+        for line in page_text.splitlines():
+            block = ' '.join(line.split())
+            if not block:
+                continue
+            block_size = len(block.encode('utf-8', 'surrogatepass'))
+            self.bytes_in += block_size
+            block_hash = hash(block)
+            if block_hash in self.seen_blocks:
+                self.bytes_removed += block_size
+            else:
+                page_blocks.add(block_hash)
+                kept.append(block)
+
+        # Repeats within the page itself are kept, only earlier pages count as boilerplate
+        self.seen_blocks |= page_blocks
+        return '\n'.join(kept)
+
+    def stats(self):
+        """Return a one-line summary of the bytes removed so far."""
+        share = self.bytes_removed / self.bytes_in if self.bytes_in else 0
+        return f"removed {self.bytes_removed:,} of {self.bytes_in:,} bytes of repeated blocks ({share:.1%})"
@@ -1,249 +1,100 @@
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import os
+import sys
+
+if __package__ in (None, ''):
+    # Run as a script, python challenge_1/challenge1.py: import the package from the repository root instead of the
+    # modules of this directory, as python -m challenge_1 does
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    __package__ = 'challenge_1'
+
 from termcolor import colored
 from colorama import init
-import usaddress
-import pyap
-from address_parser import Parser
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import PatternFill, Alignment
-import os
-from cleantext import clean
-from datetime import datetime
-import usaddress
-from urllib.parse import urljoin, urlparse
-from requests.exceptions import RequestException, SSLError
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
-# Initialize colorama
-init()  
+from .crawl_settings import (MAX_CONCURRENCY, PER_HOST_CONCURRENCY, POOL_SIZE, POOL_SIZE_PER_HOST, MAX_PAGE_BYTES,
+                             DOMAIN_BUDGET, DOMAIN_MEMORY_LIMIT, BUDGET_EXHAUSTED, SITE_MEMORY_PATH)
+from .crawl_frontier import MAX_PAGES_PER_DOMAIN
+from .html_text import DEFAULT_BACKEND
+from .checkpoint_store import CheckpointStore, CHECKPOINT_PATH
+from .crawl_metrics import CrawlMetrics, METRICS_PATH, PROMETHEUS_PATH
+from .dns_cache import DnsCache, DNS_CACHE_PATH, DNS_WORKERS
+from .postal_index import load_postal_index, CONSISTENT, AMBIGUOUS, IMPOSSIBLE
+from .run_stats import RunStats, ProgressLine, PROGRESS_INTERVAL
+from .page_cache import PAGE_CACHE_DIR
+from .pipeline import CPU_WORKERS, VALIDATE_WORKERS, STAGE_QUEUE_SIZE
+from .sharding import shard_domains, shard_path, merge_shard_results
+
+# aiohttp (with the crawl engine), lxml, geopy, pyarrow, pyap/usaddress and openpyxl are imported where they are used,
+# importing this module is cheap and starts nothing
 
 websites_path = './challenge_1/list_of_company_websites.snappy.parquet' # Path to the Parquet file containing the list of websites
-
-# Set display options to show all rows and columns
-pd.set_option('display.max_rows', None)
-pd.set_option('display.max_columns', None)
-
-# Read the Parquet file
-df = pd.read_parquet(websites_path, engine='pyarrow') 
-
-# Initialize the geolocator
-geolocator = Nominatim(user_agent="address_validator")
-
-def scrape_page_content(url):
-    """Fetches and cleans the page content."""
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.82 Safari/537.36'}
-        response = requests.get(url, verify=True, headers=headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        return soup
-    except SSLError:
-        # Skip if SSL certificate is invalid
-        print(f"Skipping insecure site (SSL verification failed): {url}")
-    except RequestException as e:
-        # Catch any other request-related errors
-        print(f"Error fetching {url}: {e}")
-    return None
-
-def scrape_links_and_content(start_url):
-    """Scrapes all reachable pages starting from the given URL and visits unique links only."""
-    
-    try:
-        visited_urls = set()  # Set to keep track of visited URLs
-        visited_hrefs = set()  # Set to keep track of visited hrefs
-        all_scraped_content = ""  # String to hold all scraped content
-
-        page_soup = scrape_page_content(start_url) # Scrape the content of the start URL
-        if page_soup is None:
-            print(f"Failed to scrape the content of {start_url}")
-            return None
-        all_scraped_content += page_soup.get_text() + '\n'  # Append the content to the main string
-
-        # Find all <a> tags on the page
-        links = page_soup.find_all('a', href=True)  # Only get links that have an href attribute
-
-        # Loop through each link and scrape its content
-        for link in links:
-            href = link['href']
-            full_url = urljoin(start_url, href)  # Construct absolute URL
-
-            # Check if the href is internal and has not been visited
-            if urlparse(full_url).netloc == urlparse(start_url).netloc and href not in visited_hrefs:
-                visited_urls.add(full_url)  # Mark the URL as visited
-                visited_hrefs.add(href)  # Mark the href as visited
-                link_soup = scrape_page_content(full_url)  # Scrape the content of the link
-                all_scraped_content += link_soup.get_text() + '\n'  # Append the content to the main string
-
-        return all_scraped_content
-    except Exception as e:
-        print(f"Error scraping links and content: {e}")
-        return None
-
-def clean_website_content(text):
-    """Clean website content by removing extra spaces and normalizing text."""
-    # Remove extra whitespace
-    if text is None:
-        return text
-    cleaned_text = ' '.join(text.split())
-    
-    # Optionally remove non-alphanumeric characters, keeping basic punctuation
-    cleaned_text = ''.join(c for c in cleaned_text if c.isalnum() or c.isspace() or c in ",.;:!?")
-    
-    return cleaned_text
-
-
-def extract_pyap(text):
-    """Extract both US and UK addresses using pyap."""
-    # Regular expressions for detecting both US and UK addresses
-    if text is None: 
-        return None
-    usa_addresses = pyap.parse(text, country='US')
-    uk_addresses = pyap.parse(text, country='GB')
-
-    # Convert extracted addresses into strings for easy handling
-    extracted_addresses = []
-
-    for address in usa_addresses:
-        extracted_addresses.append(str(address))
-
-    for address in uk_addresses:
-        extracted_addresses.append(str(address))
-
-    return extracted_addresses if extracted_addresses else None
+domain_batch_size = 65536  # Rows read from the Parquet file at a time
+
+cache_only = False  # Rerun extraction from the page and geocode caches only, without touching the network
+page_cache_dir = PAGE_CACHE_DIR  # Where fetched pages are cached between runs, None to disable
+columnar_report_path = None  # Also write the results with typed address columns, e.g. './challenge_1/results.parquet' or '.csv'
+
+max_concurrency = MAX_CONCURRENCY  # Requests in flight across all domains
+per_host_concurrency = PER_HOST_CONCURRENCY  # Requests in flight to a single host
+pool_size = POOL_SIZE  # Open connections kept by the shared HTTP pool
+pool_size_per_host = POOL_SIZE_PER_HOST  # Open connections kept to a single host
+max_pages_per_domain = MAX_PAGES_PER_DOMAIN  # Pages crawled per domain, likely address pages first
+domain_budget = DOMAIN_BUDGET  # Seconds a domain may take over all its requests, None for no limit
+max_page_bytes = MAX_PAGE_BYTES  # Bytes read from a single page at most, larger pages are cut
+domain_memory_limit = DOMAIN_MEMORY_LIMIT  # Bytes of pages and their text a domain holds at once, caps the bytes read per page
+dns_prepass = True  # Resolve every domain up front and skip the ones that do not resolve, cached in dns_cache.json
+dns_workers = DNS_WORKERS  # Domains resolved at once during the pre-pass
+dedupe_aliases = True  # Domains redirecting to a site already crawled reuse its addresses, named under 'Canonical Site'
+html_backend = DEFAULT_BACKEND  # Text extraction backend, 'lxml' (fast) or 'bs4' (BeautifulSoup fallback)
+cpu_workers = CPU_WORKERS  # Processes parsing pages and extracting addresses
+validate_workers = VALIDATE_WORKERS  # Address batches waiting on the geocoder at once
+stage_queue_size = STAGE_QUEUE_SIZE  # Items queued between two pipeline stages
+progress_interval = PROGRESS_INTERVAL  # Seconds between two progress lines
+
+# State of the run in progress, set by run()
+geocoding_service = None
+postal_index = None
+store = None
+report_layout = None
+run_stats = None
 
 
 def count_domains_in_snappy(file_path):
-    """Return the number of domains in a Snappy Parquet file."""
-    # Read the Parquet file
-    df = pd.read_parquet(file_path, engine='pyarrow') 
-    
-    # Return the number of rows in the 'domain' column
-    return df['domain'].nunique()  # Use nunique() if domains might repeat, otherwise use len(df)
-
-def apply_stats_colors(worksheet, stats_df, colors):
-    """Apply background colors to stats rows based on the metric."""
-    # Apply fill colors to rows based on the metric
-    for row_num in range(len(stats_df)):
-
-        if row_num == 0:  
-            continue  # Skip the first row (header)
-        elif row_num == 1:
-            fill_color = colors['Reachable']
-        elif row_num == 2:
-            fill_color = colors['Unreachable']
-        elif row_num == 3:
-            fill_color = colors['No Address']
-        else:
-            fill_color = None
-
-        if fill_color:
-            fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
-            # Apply the fill to the correct row in the worksheet
-            for col_num in range(1, len(stats_df.columns) + 1):
-                # Adjust for where stats_df starts in the worksheet
-                worksheet[f'{get_column_letter(col_num)}{len(results) + row_num + 3}'].fill = fill  # +3 for offset
-
-    
-# Save the results to an Excel file
-def save_results_to_excel(results):
-    """Save the results to an Excel file, adjusting column widths and applying conditional row coloring."""
-    df = pd.DataFrame(results)
-
-    output_path = './challenge_1/results.xlsx'
-
-    total_sites = len(results)
-    
-    # Count reachable, unreachable, reachable-but-no-address and validated sites
-    reachable_count = sum(1 for result in results if result['Status'] == 'Reachable')
-    unreachable_count = sum(1 for result in results if result['Status'] == 'Unreachable')
-    no_address_count = sum(1 for result in results if result['Status'] == 'Reachable - No Addresses')
-    validated_count = sum(1 for result in results if result['Status'] == 'Reachable' and result['Validated with GeoPy'] != 'Not validated')
+    """Return the number of rows of a Snappy Parquet file, from its metadata without reading the data."""
+    import pyarrow.parquet as pq
 
-    # Calculate percentages
-    reachable_percentage = (reachable_count / total_sites) * 100
-    unreachable_percentage = (unreachable_count / total_sites) * 100
-    no_address_percentage = (no_address_count / total_sites) * 100
-    validated_percentage = (validated_count / total_sites) * 100
-
-    # Create a DataFrame for the stats
-    stats_data = {
-        'Metric': ['Reachable sites', 'Unreachable sites', 'Reachable but no addresses', 'Reachable with validated address', 'Total sites checked'],
-        'Count': [reachable_count, unreachable_count, no_address_count, validated_count, total_sites],
-        'Percentage': [f'{reachable_percentage:.2f}%', f'{unreachable_percentage:.2f}%', f'{no_address_percentage:.2f}%', f'{validated_percentage:.2f}%', None]  # Fixed total sites percentage
-    }
-    stats_df = pd.DataFrame(stats_data)
+    return pq.ParquetFile(file_path).metadata.num_rows
 
-    # Color for different metrics
-    colors = {
-        'Reachable': 'C6EFCE',  # Light Green
-        'Unreachable': 'FFC7CE',  # Light Red
-        'No Address': 'D9D9D9',  # Light Gray
-    }
 
-    # Save the results to an Excel file
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Results')
-
-        workbook = writer.book
-        worksheet = writer.sheets['Results']
-
-        max_width = 50  # Set max width for columns
-
-        # Adjust column widths
-        for col_num, col_name in enumerate(df.columns, start=1):
-            max_length = max(df[col_name].astype(str).map(len).max(), len(col_name))
-            adjusted_width = min(max_length + 2, max_width)
-            worksheet.column_dimensions[get_column_letter(col_num)].width = adjusted_width
-
-            # Ensure text is not wrapped in each cell
-            for row_num in range(1, len(df) + 2):  # +2 to account for header
-                cell = worksheet.cell(row=row_num, column=col_num)
-                cell.alignment = Alignment(wrap_text=False)  # Disable text wrapping
-
-        # Apply conditional coloring to rows based on 'Status'
-        for row_num in range(2, len(df) + 2):  # Data starts from row 2 (index 0 in DataFrame)
-            status_cell = worksheet[f'C{row_num}']  # Column C holds the 'Status'
-            status_value = status_cell.value  # Get the status value from the cell
-            
-            # Determine the fill color based on the 'Status'
-            if status_value == 'Reachable':
-                fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")  # Green
-            elif status_value == 'Reachable - No Addresses':
-                fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")  # Gray (Reachable but no address)
-            else:
-                fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")  # Red (Unreachable)
-
-            # Apply the fill to the entire row
-            for col_num in range(1, len(df.columns) + 1):
-                worksheet[f'{get_column_letter(col_num)}{row_num}'].fill = fill
-        
-        # Write stats DataFrame starting just below the main data
-        stats_df.to_excel(writer, index=False, sheet_name='Results', startrow=len(df) + 2)  # Start from the row after the results
-
-        # Call your coloring function here
-        apply_stats_colors(worksheet, stats_df, colors)
-        
-
-def display_stats(results):
-    """Calculate and display statistics of reachable, unreachable, reachable-but-no-address and validated sites."""
-    total_sites = len(results)
-    
-    # Count reachable, unreachable, and reachable-but-no-address
-    reachable_count = sum(1 for result in results if result['Status'] == 'Reachable')
-    unreachable_count = sum(1 for result in results if result['Status'] == 'Unreachable')
-    no_address_count = sum(1 for result in results if result['Status'] == 'Reachable - No Addresses')
-    validated_count = sum(1 for result in results if result['Status'] == 'Reachable' and result['Validated with GeoPy'] != 'Not validated')
+def read_domains(file_path, batch_size=domain_batch_size):
+    """Yield the domains of a Parquet file one record batch at a time, each domain once."""
+    import pyarrow.parquet as pq
+
+    seen = set()
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=batch_size, columns=['domain']):
+        for domain in batch.column(0).to_pylist():
+            if domain and domain not in seen:
+                seen.add(domain)
+                yield domain
+
+
+def display_stats(stats):
+    """Display statistics of reachable, unreachable, reachable-but-no-address and validated sites from the run aggregates."""
+    total_sites = stats.results
+
+    # Counts kept up to date as results come in
+    reachable_count = stats.count('Reachable')
+    unreachable_count = stats.count('Unreachable')
+    no_address_count = stats.count('Reachable - No Addresses')
+    budget_exhausted_count = stats.count(BUDGET_EXHAUSTED)
+    validated_count = stats.validated
 
     # Calculate percentages
-    reachable_percentage = (reachable_count / total_sites) * 100
-    unreachable_percentage = (unreachable_count / total_sites) * 100
-    no_address_percentage = (no_address_count / total_sites) * 100
-    validated_percentage = (validated_count / total_sites) * 100
+    reachable_percentage = stats.percentage(reachable_count)
+    unreachable_percentage = stats.percentage(unreachable_count)
+    no_address_percentage = stats.percentage(no_address_count)
+    validated_percentage = stats.percentage(validated_count)
+    budget_exhausted_percentage = stats.percentage(budget_exhausted_count)
 
     # Display stats with colors
     print("\n===== " + colored("Summary of Results", 'cyan') + " =====")
@@ -252,145 +103,189 @@ def display_stats(results):
     print(f"Validated addresses: {colored(validated_count, 'green')} ({colored(f'{validated_percentage:.2f}%', 'green')})")
     print(f"Unreachable sites: {colored(unreachable_count, 'red')} ({colored(f'{unreachable_percentage:.2f}%', 'red')})")
     print(f"Reachable but no addresses: {colored(no_address_count, 'yellow')} ({colored(f'{no_address_percentage:.2f}%', 'yellow')})")
+    print(f"Out of time budget: {colored(budget_exhausted_count, 'yellow')} ({colored(f'{budget_exhausted_percentage:.2f}%', 'yellow')})")
     print("==============================\n")
 
-def extract_usaddress(text):
-    """Extract addresses using the usaddress library."""
-    try:
-        if text is None:
-            return None
-
-        # Parse the text using usaddress
-        parsed_addresses = usaddress.tag(text)
-        components = parsed_addresses[0]  
-        usaddress_result = (
-                    'USA',  # Assuming it's a USA address
-                    components.get('StateName', None),  # Region (State)
-                    components.get('PlaceName', None),  # City
-                    components.get('ZipCode', None),  # Postcode
-                    components.get('StreetName', None),  # Road
-                    components.get('AddressNumber', None)  # Road number
-        )
-        # Check if all components are not None
-        if all(component is not None for component in usaddress_result):
-            return usaddress_result
-        else: return None
-
-    except Exception as e:
-        print(f"Error extracting address using usaddress: {e}")
-        return None
-    
-
-def parse_address_for_geopy(address_text):
-    """Parse and format address using usaddress."""
-    try:
-        # Prepare the address for geopy
-        parsed_address = usaddress.tag(address_text)[0]
-        formatted_address = "{}, {}, {}, {}".format(
-            parsed_address.get('AddressNumber', ''),
-            parsed_address.get('StreetName', ''),
-            parsed_address.get('PlaceName', ''),
-            parsed_address.get('StateName', ''),
-        )
-        return formatted_address
-    except usaddress.RepeatedLabelError:
-        print("Error parsing address:", address_text)
-        return None
-
 def validate_address_with_geopy(formatted_address):
-    """Validate address with geopy."""
-    try:
-        location = geolocator.geocode(formatted_address)
-        if location:
-            return {"latitude": location.latitude, "longitude": location.longitude, "address": location.address}
-        else:
-            return None
-    except (GeocoderTimedOut, GeocoderServiceError) as e:
-        print(f"Geocoding error for {formatted_address}: {e}")
-        return None
-
-
-# Initialize results list
-results = []
-
-# Get the total number of domains in the Snappy Parquet file
-domains_count = count_domains_in_snappy(websites_path)
-
-# Loop through the websites and check their status
-for idx, website in enumerate(df['domain']):
-    try:
-        print(f"Checking website {idx + 1}/{domains_count}: {website}")
-        url = 'http://' + website
-        response = requests.get(url, timeout=5)  # timeout after 5 seconds
-        
-        # Check if the status code is not 200
-        if response.status_code != 200:
-            url = 'https://' + website
-            response = requests.get(url, timeout=5)  # timeout after 5 seconds
-
-        # Check if the website is reachable
-        if response.status_code == 200:
-            print(colored(f"Website {website} is reachable.", 'green'))
-            website_content = scrape_links_and_content(url)
-
-            # Clean the website content
-            cleaned_content = clean_website_content(website_content)
-            
-            # Extract addresses using various methods
-            usaddress_results = []
-            pyap_results = extract_pyap(cleaned_content)
-            if pyap_results:
-                for address in pyap_results:
-                    usaddress_results.append(extract_usaddress(address))
-
-            # Remove duplicates from usaddress_results
-            usaddress_results = list(set(usaddress_results))
-
-            # Check if usaddress_results contains only None objects
-            if all(result is None for result in usaddress_results):
-                usaddress_results = []
-
-            #Validate addresses using geopy
-            geopy_validated_addresses = []
-            for address in usaddress_results:
-                if address is not None:
-                    formatted_address = ', '.join(filter(None, address))
-                    parsed_geopy = parse_address_for_geopy(formatted_address)
-                    geopy_results = validate_address_with_geopy(parsed_geopy)
-                    if geopy_results:
-                        geopy_validated_addresses.append(address)
-
-            # Store the results
-            results.append({
-                'Domain': website,
-                'URL': f'=HYPERLINK("{url}", "{url}")',
-                'Status': 'Reachable' if pyap_results else 'Reachable - No Addresses',
-                'Validated with GeoPy': geopy_validated_addresses if geopy_validated_addresses else 'Not validated'
-            })
-
-            # Save the results to Excel
-            save_results_to_excel(results)
-
-            # Display the statistics
-            display_stats(results)
-        else:
-            print(colored(f"Website {website} is not reachable. Status code: {response.status_code}", 'red'))
-            results.append({
-                'Domain': website,
-                'URL': f'=HYPERLINK("{url}", "{url}")',
-                'Status': 'Unreachable'
-            })
-
-            save_results_to_excel(results)
-            display_stats(results)
-    except requests.exceptions.RequestException as e:
-        print(colored(f"Error reaching {website}: {e}", 'red'))
-        results.append({
-            'Domain': website,
-            'URL': f'=HYPERLINK("{url}", "{url}")',
-            'Status': 'Unreachable',
-        })
-
-        save_results_to_excel(results)
-        display_stats(results)
+    """Validate address with geopy, answering from the geocode cache when possible."""
+    return geocoding_service.geocode(formatted_address)
+
+
+def validate_addresses(usaddress_results):
+    """Validate usaddress tuples and return the valid ones.
+
+    The postal index settles ZIP, state and city consistency offline, only the ambiguous addresses are queued for geopy.
+    """
+    from .address_extraction import parse_address_for_geopy  # Loads usaddress, imported on first use
+
+    pending_validations = []
+    for address in usaddress_results:
+        verdict = postal_index.check_address(address) if postal_index else AMBIGUOUS
+        if verdict == IMPOSSIBLE:
+            continue
+        if verdict == CONSISTENT:
+            pending_validations.append((address, None))
+            continue
+        # The tagged components are formatted directly, the address is never tagged a second time
+        parsed_geopy = parse_address_for_geopy(address)
+        pending_validations.append((address, geocoding_service.submit(parsed_geopy)))
+    return [address for address, validation in pending_validations if validation is None or validation.result()]
+
+
+def build_result(website, url, pyap_results, geopy_validated_addresses):
+    """Return the result record of a reachable website from its extracted and validated addresses."""
+    return {
+        'Domain': website,
+        'URL': f'=HYPERLINK("{url}", "{url}")',
+        'Status': 'Reachable' if pyap_results else 'Reachable - No Addresses',
+        'Validated with GeoPy': geopy_validated_addresses if geopy_validated_addresses else 'Not validated'
+    }
+
 
+def record_result(result):
+    """Store a finished result in the checkpoint store and count it, the progress line shows the statistics."""
+    store.append(result)
+    report_layout.add(result)
+    run_stats.add(result)
+
+
+def save_reports(results, output_path=None, columnar_path=None, layout=None, stats=None):
+    """Write the Excel report, to results.xlsx unless another path is given, and the columnar one if a path is given."""
+    from .excel_report import save_results_to_excel, save_results_columnar, RESULTS_PATH
+
+    save_results_to_excel(results, output_path or RESULTS_PATH, layout, stats)
+    if columnar_path:
+        save_results_columnar(results, columnar_path)
+
+
+def merge_shards(shard_count=None):
+    """Combine the result shards of every worker into one report with global statistics."""
+    results = merge_shard_results(CHECKPOINT_PATH, shard_count)
+    stats = RunStats(len(results))
+    for result in results:
+        stats.add(result, resumed=True)
+    display_stats(stats)
+    save_reports(results, columnar_path=columnar_report_path, stats=stats)
+    return results
+
+
+def run(shard_index=0, shard_count=1, domains=None):
+    """Crawl, extract and validate the domains of one shard, then write its report.
+
+    domains defaults to the domains of the Parquet file at websites_path, streamed in record batches; any iterable of
+    domain names can be passed instead. Each shard writes its own checkpoint, metrics, site memory and report, so a
+    failed shard is rerun alone. Returns the RunStats of the shard.
+    """
+    global geocoding_service, postal_index, store, report_layout, run_stats
+    from geopy.geocoders import Nominatim
+    from .crawl_engine import crawl_websites
+    from .address_extraction import extract_addresses
+    from .geocode_cache import GeocodingService, GeocodeCache
+    from .excel_report import ReportLayout, RESULTS_PATH
+
+    if domains is None:
+        domains = read_domains(websites_path)
+        # The row count of the file, duplicates included, an estimate for a shard
+        domains_count = count_domains_in_snappy(websites_path) // shard_count
+    else:
+        domains_count = len(domains) // shard_count if hasattr(domains, '__len__') else None
+
+    # Initialize the geolocator
+    geolocator = Nominatim(user_agent="address_validator")
+
+    # Geocoding answers are cached on disk, misses go through a rate-limited background queue
+    geocoding_service = GeocodingService(geolocator, GeocodeCache(), cache_only=cache_only)
+
+    # Offline ZIP, state and city consistency check, impossible addresses never reach the geocoder
+    postal_index = load_postal_index()
+
+    # The domains of this shard, hashed on the domain name so every worker agrees on the partition
+    domains = shard_domains(domains, shard_index, shard_count)
+    if shard_count > 1:
+        print(f"Shard {shard_index} of {shard_count}: about {domains_count} domains")
+
+    # Stage times and counters of every domain go to crawl_metrics.jsonl, run totals to crawl_metrics.prom
+    metrics = CrawlMetrics(shard_path(METRICS_PATH, shard_index, shard_count),
+                           shard_path(PROMETHEUS_PATH, shard_index, shard_count), budget=domain_budget)
+
+    with CheckpointStore(shard_path(CHECKPOINT_PATH, shard_index, shard_count)) as store:
+        # Skip the domains a previous run already finished, as the list streams in
+        pending_domains = (website for website in domains if not store.is_done(website))
+        if store.results:
+            print(f"Resuming: {len(store.results)} domains already done")
+
+        # Column widths of the report and the run statistics are worked out as results come in
+        report_layout = ReportLayout()
+        run_stats = RunStats(domains_count)
+        for result in store.results:
+            report_layout.add(result)
+            run_stats.add(result, resumed=True)
+
+        # Resolve the domains in bulk first, a cache-only run never touches the network
+        dns_cache = DnsCache(shard_path(DNS_CACHE_PATH, shard_index, shard_count), dns_workers) \
+            if dns_prepass and not cache_only else None
+
+        # Crawl the websites concurrently, results are recorded in the order they finish
+        with ProgressLine(run_stats, progress_interval):
+            asyncio.run(crawl_websites(pending_domains, extract_addresses, validate_addresses, build_result, record_result,
+                                       total=domains_count, start=len(store.results),
+                                       max_concurrency=max_concurrency, per_host_concurrency=per_host_concurrency,
+                                       max_pages=max_pages_per_domain, domain_budget=domain_budget,
+                                       domain_memory_limit=domain_memory_limit, max_page_bytes=max_page_bytes,
+                                       pipeline_settings=dict(cpu_workers=cpu_workers, validate_workers=validate_workers,
+                                                              queue_size=stage_queue_size, html_backend=html_backend),
+                                       pool_size=pool_size, pool_size_per_host=pool_size_per_host,
+                                       metrics=metrics, stats=run_stats, dns_cache=dns_cache, dedupe_aliases=dedupe_aliases,
+                                       page_cache_dir=page_cache_dir, cache_only=cache_only,
+                                       site_memory_path=shard_path(SITE_MEMORY_PATH, shard_index, shard_count)))
+
+        if dns_cache:
+            # Keep the hosts first resolved during the crawl, redirect targets among them
+            dns_cache.save()
+
+        # Final summary, from the counts kept during the run
+        display_stats(run_stats)
+
+        # Build the Excel report once, from everything in the store
+        with metrics.timed_run_stage('excel'):
+            save_reports(store.results, shard_path(RESULTS_PATH, shard_index, shard_count),
+                         shard_path(columnar_report_path, shard_index, shard_count), report_layout, run_stats)
+
+    geocoding_service.close()
+    geocoding_service.cache.close()
+
+    metrics.add_counters(geocoding_service.stats())
+    if postal_index:
+        metrics.add_counters(postal_index.stats())
+        postal_index.close()
+    metrics.run_stages['geocoder'] += geocoding_service.geocoder_seconds
+    metrics.close()
+    print(metrics.slowest_report())
+    return run_stats
+
+
+USAGE = """usage: python challenge_1/challenge1.py [<shard index> <shard count>]
+       python challenge_1/challenge1.py merge [<shard count>]"""
+
+
+def main(argv=None):
+    """Command line entry point, see USAGE."""
+    argv = sys.argv[1:] if argv is None else argv
+    init()  # Initialize colorama
+    if argv and argv[0] == 'merge':
+        if len(argv) > 2 or (len(argv) == 2 and not argv[1].isdigit()):
+            sys.exit(USAGE)
+        merge_shards(int(argv[1]) if len(argv) > 1 else None)
+        return
+    # A shard index alone would silently crawl the whole list into the unsharded files
+    if len(argv) not in (0, 2) or not all(arg.isdigit() for arg in argv):
+        sys.exit(USAGE)
+    shard_index, shard_count = (int(argv[0]), int(argv[1])) if argv else (0, 1)
+    if shard_index >= shard_count:
+        sys.exit(f"Shard index {shard_index} is outside 0..{shard_count - 1}\n{USAGE}")
+    run(shard_index, shard_count)
+
+
+# The worker processes of the pipeline import this module, only the main process crawls
+if __name__ == "__main__":
+    main()
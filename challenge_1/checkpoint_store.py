@@ -0,0 +1,89 @@
+import json
+import os
+
+CHECKPOINT_PATH = './challenge_1/results_checkpoint.jsonl'  # One JSON result record per line
+
+
+def decode_result(result):
+    """Restore the address tuples that JSON stores as lists."""
+    validated = result.get('Validated with GeoPy')
+    if isinstance(validated, list):
+        result['Validated with GeoPy'] = [tuple(address) for address in validated]
+    return result
+
+
+def load_results(path=CHECKPOINT_PATH):
+    """Return every result record stored in the checkpoint file, in the order they were written."""
+    results = []
+    if not os.path.exists(path):
+        return results
+
+    with open(path, encoding='utf-8') as file:
+        for line_num, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                results.append(decode_result(json.loads(line)))
+            except ValueError:
+                # A crash in the middle of a write leaves a truncated last line, the store cuts it off before loading
+                # so the domain is simply redone
+                print(f"Skipping unreadable checkpoint line {line_num} in {path}")
+    return results
+
+
+def drop_partial_line(path):
+    """Cut off a last line left without its newline by a crash mid-write, so the next record starts a new line."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as file:
+        end = file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        file.seek(end - 1)
+        if file.read(1) == b'\n':
+            return
+        # Look back block by block for the end of the last complete line
+        position = end
+        while position > 0:
+            start = max(position - 65536, 0)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b'\n')
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        file.truncate(position)
+        print(f"Dropped a partial last line of {end - position} bytes from {path}")
+
+
+class CheckpointStore:
+    """Append-only store that keeps every finished result on disk as soon as it is ready."""
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        # Cut first, a last record that lost only its newline would otherwise be loaded as done and then dropped
+        drop_partial_line(path)
+        self.results = load_results(path)
+        self.completed_domains = {result['Domain'] for result in self.results}
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def append(self, result):
+        """Write a single result record and make sure it reaches the disk."""
+        self.file.write(json.dumps(result) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.results.append(result)
+        self.completed_domains.add(result['Domain'])
+
+    def is_done(self, website):
+        """Return True if the domain already has a stored result."""
+        return website in self.completed_domains
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
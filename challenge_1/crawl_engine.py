@@ -0,0 +1,392 @@
+import asyncio
+import contextlib
+import time
+from itertools import islice
+from urllib.parse import urljoin, urlparse
+
+import aiohttp
+from termcolor import colored
+
+from .boilerplate import BoilerplateFilter
+from .crawl_metrics import timed, count
+from .crawl_frontier import CrawlFrontier, MAX_PAGES_PER_DOMAIN
+from .crawl_settings import (MAX_CONCURRENCY, PER_HOST_CONCURRENCY, MAX_PAGE_BYTES, DOMAIN_BUDGET, DOMAIN_MEMORY_LIMIT,
+                             BUDGET_EXHAUSTED)
+from .http_client import HttpClient, CrawlLimiter, CachedResolver, CONNECT_TIMEOUT, READ_TIMEOUT
+from .pipeline import StagedPipeline
+from .site_registry import SiteRegistry, site_key, page_fingerprint
+
+PROBE_TIMEOUT = 5  # Seconds to wait for each reachability probe, connect and read alike
+BUDGET_GRACE = 5  # Seconds past the budget before a domain stuck outside its requests is cancelled
+DNS_BATCH_SIZE = 5000  # Websites resolved together by the DNS pre-pass, ahead of the crawl
+
+
+class DomainBudget:
+    """Deadline shared by every request of one domain."""
+
+    def __init__(self, seconds=DOMAIN_BUDGET):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.exhausted = False  # Set once the domain stopped crawling because the time ran out
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, total=None):
+        """Return the timeout of a request, cut short to what is left of the budget."""
+        remaining = self.remaining()
+        if remaining is not None:
+            # A zero total disables the aiohttp timeout, keep a sliver instead
+            total = max(min(total, remaining) if total else remaining, 0.01)
+        # A per-request timeout replaces the session one, so the connect and read timeouts are repeated here
+        return aiohttp.ClientTimeout(total=total, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+
+
+async def scrape_page_content(client, pipeline, url, budget=None):
+    """Fetches the page, within what is left of the domain budget, and returns its visible text and links."""
+    timeout = {'timeout': budget.timeout()} if budget else {}
+    try:
+        with timed('fetch'):
+            status, final_url, html = await client.fetch_page(client.rewrite_url(url), **timeout)
+        count('pages')
+        # Parsing is CPU-bound, it runs in the pipeline's worker processes
+        with timed('parse'):
+            return await pipeline.parse_html(html)
+    except aiohttp.ClientSSLError:
+        # Skip if SSL certificate is invalid
+        print(f"Skipping insecure site (SSL verification failed): {url}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Catch any other request-related errors
+        print(f"Error fetching {url}: {e}")
+    return None
+
+
+def queue_links(client, frontier, links, page_url):
+    """Add the links of a fetched page to the frontier, resolved on the final origin."""
+    for href, anchor_text, in_footer in links:
+        full_url = client.rewrite_url(urljoin(page_url, href))  # Construct absolute URL on the final origin
+        frontier.add(full_url, anchor_text, in_footer)
+
+
+def merge_unique(merged, new_items):
+    """Append the items not already in merged, keeping their order."""
+    for item in new_items or []:
+        if item not in merged:
+            merged.append(item)
+
+
+def start_page_failed(start_url, budget):
+    """Report a start page that could not be scraped, marking the budget if the time ran out."""
+    print(f"Failed to scrape the content of {start_url}")
+    if budget:
+        budget.exhausted = budget.expired()
+
+
+async def scrape_links_and_content(client, pipeline, start_url, max_pages=MAX_PAGES_PER_DOMAIN, budget=None,
+                                   start_page=None):
+    """Scrapes the pages of a site best-ranked first, within a page budget, extracting addresses batch by batch.
+
+    Returns the pyap hits and the validated addresses of the site, or None if the start page could not be scraped.
+    The crawl of the domain stops after the first batch holding a validated address, when its time budget runs
+    out, which is marked on the budget, or when the host failed too many requests in a row.
+    start_page is the (text, links) of the start URL when it was already scraped.
+    """
+    try:
+        # Scrape the content of the start URL
+        if start_page is None:
+            start_page = await scrape_page_content(client, pipeline, start_url, budget)
+        if start_page is None:
+            start_page_failed(start_url, budget)
+            return None
+
+        start_text, start_links = start_page
+        frontier = CrawlFrontier(start_url, max_pages)
+        queue_links(client, frontier, start_links, start_url)
+
+        # Header, footer and navigation text repeated across the pages is kept only once
+        boilerplate = BoilerplateFilter()
+        batch_texts = [boilerplate.filter(start_text)]
+        page_count = 1
+        pyap_results, validated_addresses = [], []
+
+        while True:
+            # Extraction and validation run in the pipeline stages while other domains keep fetching
+            if batch_texts:
+                batch_pyap, batch_validated = await pipeline.analyze(batch_texts)
+                merge_unique(pyap_results, batch_pyap)
+                merge_unique(validated_addresses, batch_validated)
+            if validated_addresses or not frontier:
+                break
+            if budget and budget.expired():
+                print(f"{start_url}: time budget of {budget.seconds} s used up, skipping the remaining subpages")
+                budget.exhausted = True
+                break
+            host = urlparse(client.rewrite_url(start_url)).netloc
+            if client.breaker.is_open(host):
+                print(f"{start_url}: too many failed requests, skipping the remaining subpages")
+                count('breaker_skips')
+                break
+
+            # Fetch as many pages at once as the host allows, re-ranking after every batch
+            batch = frontier.next_batch(client.limiter.per_host_concurrency)
+            batch_pages = await asyncio.gather(*(scrape_page_content(client, pipeline, url, budget) for url in batch))
+
+            # Skip subpages that failed instead of dropping the whole site
+            batch_texts = []
+            for url, page in zip(batch, batch_pages):
+                if page is not None:
+                    text, links = page
+                    queue_links(client, frontier, links, url)
+                    batch_texts.append(boilerplate.filter(text))
+            page_count += len(batch_texts)
+
+        print(f"{start_url}: {page_count} pages, {boilerplate.stats()}")
+        count('boilerplate_bytes_in', boilerplate.bytes_in)
+        count('boilerplate_bytes_removed', boilerplate.bytes_removed)
+        return pyap_results, validated_addresses
+    except Exception as e:
+        print(f"Error scraping links and content: {e}")
+        return None
+
+
+async def reuse_site(site, website, budget):
+    """Return the addresses found by the crawl of another website landing on the same site, waiting for it if needed.
+
+    Returns None if there is no such crawl or it did not get through, the out of time mark is copied to the budget.
+    """
+    if site is None or site.website == website:
+        return None
+    print(f"{website} lands on the site of {site.website}, reusing its crawl")
+    # Shielded so this domain running out of time does not cancel the crawl other domains wait on
+    shared = await asyncio.shield(site.addresses)
+    if shared is None:
+        return None
+    pyap_results, validated_addresses, exhausted = shared
+    budget.exhausted = exhausted
+    count('alias_reuses')
+    return pyap_results, validated_addresses
+
+
+async def crawl_site(client, pipeline, website, start_url, max_pages, budget, sites=None):
+    """Crawl the site a website landed on, unless a website landing on the same site was crawled or is being crawled.
+
+    Sites are known by the host and path they land on after redirects and by a fingerprint of the landing page text.
+    Returns the pyap hits and validated addresses (or None like scrape_links_and_content) and the website whose
+    crawl was reused, None when the site was crawled here.
+    """
+    if sites is None:
+        return await scrape_links_and_content(client, pipeline, start_url, max_pages, budget), None
+
+    host_key = site_key(start_url)
+    other = sites.find(host_key)
+    addresses = await reuse_site(other, website, budget)
+    if addresses is not None:
+        return addresses, other.website
+
+    site = sites.claim(website, host_key)
+    try:
+        start_page = await scrape_page_content(client, pipeline, start_url, budget)
+        if start_page is None:
+            start_page_failed(start_url, budget)
+            return None, None
+        fingerprint = page_fingerprint(start_page[0])
+        other = sites.find(fingerprint)
+        addresses = await reuse_site(other, website, budget)
+        if addresses is not None:
+            # Domains waiting on this host get the reused crawl as well
+            site.website = other.website
+            site.finish((*addresses, budget.exhausted))
+            return addresses, other.website
+
+        sites.add_keys(site, fingerprint)
+        addresses = await scrape_links_and_content(client, pipeline, start_url, max_pages, budget, start_page)
+        if addresses is not None:
+            site.finish((*addresses, budget.exhausted))
+        return addresses, None
+    finally:
+        # A crawl that failed or was cancelled leaves the waiting domains to crawl on their own
+        site.finish(None)
+
+
+async def fetch_status(client, url, budget=None):
+    """Return the status code and final URL, after redirects, of a probe request."""
+    timeout = budget.timeout(PROBE_TIMEOUT) if budget else aiohttp.ClientTimeout(total=PROBE_TIMEOUT)
+    return await client.fetch_status(url, timeout=timeout)
+
+
+async def probe_website(client, website, budget=None):
+    """Return the probed URL, status code and final URL of the website.
+
+    A domain that answered before is probed on its remembered origin, others try http:// before https://.
+    """
+    url = client.site_url(website)
+    if url:
+        try:
+            status, final_url = await fetch_status(client, url, budget)
+            if status == 200:
+                return url, status, final_url
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        # The remembered origin stopped answering, probe the domain from scratch
+        client.forget_site(website)
+
+    url = 'http://' + website
+    status, final_url = await fetch_status(client, url, budget)
+
+    # Retry over https:// if the plain http:// answer is not 200
+    if status != 200:
+        url = 'https://' + website
+        status, final_url = await fetch_status(client, url, budget)
+
+    if status == 200:
+        client.remember_site(website, final_url)
+    return url, status, final_url
+
+
+async def check_website(client, pipeline, website, build_result, max_pages=MAX_PAGES_PER_DOMAIN,
+                        domain_budget=DOMAIN_BUDGET, sites=None):
+    """Probe, crawl and process a single website within its time budget, returning its result record.
+
+    A site that ran out of time before finding a validated address gets the BUDGET_EXHAUSTED status.
+    With sites, a SiteRegistry, a website landing on a site already crawled reuses its addresses and its record
+    names that website under 'Canonical Site'.
+    """
+    url = 'http://' + website
+    budget = DomainBudget(domain_budget)
+    status = None
+    canonical = None
+    try:
+        # The requests stop at the deadline, the grace period cancels a domain stuck anywhere else
+        async with asyncio.timeout(domain_budget + BUDGET_GRACE if domain_budget is not None else None):
+            with timed('probe'):
+                url, status, final_url = await probe_website(client, website, budget)
+            if status == 200:
+                print(colored(f"Website {website} is reachable.", 'green'))
+                addresses, canonical = await crawl_site(client, pipeline, website, final_url, max_pages, budget, sites)
+                pyap_results, validated_addresses = addresses if addresses else (None, [])
+                if validated_addresses or not budget.exhausted:
+                    return with_canonical(build_result(website, url, pyap_results, validated_addresses), canonical)
+
+        if status is not None and status != 200:
+            print(colored(f"Website {website} is not reachable. Status code: {status}", 'red'))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if budget.expired():
+            budget.exhausted = True
+        print(colored(f"Error reaching {website}: {e}", 'red'))
+
+    if budget.exhausted:
+        print(colored(f"Website {website} ran out of its {domain_budget} s budget.", 'yellow'))
+        count('budget_exhausted')
+        return with_canonical(unreachable_result(website, url, BUDGET_EXHAUSTED), canonical)
+    return unreachable_result(website, url)
+
+
+def with_canonical(result, canonical):
+    """Name the website whose crawl the result reuses, if any."""
+    if canonical is not None:
+        result['Canonical Site'] = canonical
+    return result
+
+
+def unreachable_result(website, url, status='Unreachable'):
+    """Return the result record of a website no address could be looked for on."""
+    return {
+        'Domain': website,
+        'URL': f'=HYPERLINK("{url}", "{url}")',
+        'Status': status,
+    }
+
+
+async def crawl_websites(websites, extract, validate, build_result, on_result, total=None, start=0,
+                         max_concurrency=MAX_CONCURRENCY, per_host_concurrency=PER_HOST_CONCURRENCY,
+                         max_pages=MAX_PAGES_PER_DOMAIN, domain_budget=DOMAIN_BUDGET,
+                         domain_memory_limit=DOMAIN_MEMORY_LIMIT, pipeline_settings=None, metrics=None, stats=None,
+                         dns_cache=None, dedupe_aliases=True, **client_settings):
+    """Crawl the websites concurrently, passing each result record to on_result as soon as it is ready.
+
+    extract runs in worker processes on batches of page texts and returns (pyap hits, usaddress tuples, stage timings),
+    validate runs in threads on the usaddress tuples and returns the validated ones, and
+    build_result(website, url, pyap hits, validated addresses) makes the result record of a reachable site.
+    Each domain is crawled up to max_pages pages, stopping at the first batch holding a validated address,
+    and for at most domain_budget seconds. domain_memory_limit bounds the bytes of page bodies and their extracted
+    text a domain holds at once, by capping the bytes read per page (see below).
+
+    pipeline_settings is passed to StagedPipeline, e.g. cpu_workers, validate_workers, queue_size or html_backend.
+    metrics, a CrawlMetrics, receives the stage times and counters of every finished domain.
+    stats, a RunStats, counts the domains taken by the crawl so it can tell how many are in flight.
+    dns_cache, a DnsCache, resolves the websites in batches ahead of the crawl: websites that do not resolve are
+    recorded Unreachable without any request and the connection pool reuses the cached addresses.
+    websites may be any iterable, e.g. a generator streaming a large list, it is consumed as the crawl goes.
+    With dedupe_aliases, websites landing on a site already crawled, or being crawled, after redirects reuse its
+    addresses instead of crawling it again.
+    Extra keyword arguments are passed to HttpClient, e.g. pool_size, page_cache_dir or cache_only.
+    """
+    limiter = CrawlLimiter(max_concurrency, per_host_concurrency)
+    if domain_memory_limit is not None:
+        # A domain holds one batch of pages at a time, each page as its body and, once parsed, its text (never more
+        # than the body), plus the text of the landing page kept until the crawl of the site ends: the limit is split
+        # into two shares per page of a batch and one for the landing page. Sizes are counted as bytes read, the
+        # memory taken by the Python strings and by the parse in the worker processes is not counted
+        client_settings['max_page_bytes'] = min(client_settings.get('max_page_bytes', MAX_PAGE_BYTES),
+                                                domain_memory_limit // (2 * per_host_concurrency + 1))
+    if dns_cache:
+        client_settings.setdefault('resolver', CachedResolver(dns_cache))
+    websites = enumerate(websites, start)
+    queue = asyncio.Queue(max_concurrency)
+    sites = SiteRegistry() if dedupe_aliases else None
+
+    async def resolve(batch):
+        if dns_cache and batch:
+            with metrics.timed_run_stage('dns') if metrics else contextlib.nullcontext():
+                unresolvable = await dns_cache.resolve_all([website for _, website in batch])
+            print(f"Resolved {len(batch)} websites, {unresolvable} do not resolve")
+
+    async def feed():
+        # Websites are read a batch at a time, so a streamed list starts crawling before it is read to the end,
+        # and the next batch is resolved while the workers take the current one
+        batch = list(islice(websites, DNS_BATCH_SIZE))
+        resolving = asyncio.create_task(resolve(batch))
+        while batch:
+            await resolving
+            next_batch = list(islice(websites, DNS_BATCH_SIZE))
+            resolving = asyncio.create_task(resolve(next_batch))
+            for item in batch:
+                await queue.put(item)
+            batch = next_batch
+        for _ in range(max_concurrency):
+            await queue.put(None)
+
+    async def worker():
+        # Each worker takes the next website until the list runs out
+        while (item := await queue.get()) is not None:
+            idx, website = item
+            print(f"Checking website {idx + 1}/{total}: {website}")
+            if stats:
+                stats.domain_started()
+            domain_metrics = metrics.start_domain(website) if metrics else None
+            if dns_cache and dns_cache.is_unresolvable(website):
+                print(colored(f"Website {website} does not resolve.", 'red'))
+                count('unresolvable')
+                result = unreachable_result(website, 'http://' + website)
+            else:
+                try:
+                    result = await check_website(client, pipeline, website, build_result, max_pages, domain_budget,
+                                                 sites)
+                except Exception as e:
+                    # A malformed name or redirect target fails this domain only, the crawl moves on to the next one
+                    print(colored(f"Error checking {website}: {e}", 'red'))
+                    result = unreachable_result(website, 'http://' + website)
+            if metrics:
+                metrics.finish_domain(domain_metrics, result['Status'])
+            await pipeline.record(result)
+
+    async with StagedPipeline(extract, validate, on_result, **(pipeline_settings or {})) as pipeline:
+        async with HttpClient(limiter, **client_settings) as client:
+            # One worker per global slot keeps every slot busy without creating a task per domain up front
+            await asyncio.gather(feed(), *(worker() for _ in range(max_concurrency)))
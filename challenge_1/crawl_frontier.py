@@ -0,0 +1,80 @@
+import heapq
+import re
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+MAX_PAGES_PER_DOMAIN = 20  # Pages fetched per domain, the start page included
+
+# Path or link text keywords of pages likely to hold the company address, best first
+ADDRESS_PAGE_KEYWORDS = [
+    (re.compile(r'contact|kontakt|get-in-touch|reach-us'), 100),
+    (re.compile(r'location|find-us|visit|directions|offices?\b|branches|stores?\b'), 90),
+    (re.compile(r'about|company|who-we-are|our-story'), 80),
+    (re.compile(r'imprint|impressum|legal|privacy|terms|disclaimer'), 50),
+]
+FOOTER_BONUS = 20  # Footer links point at contact and legal pages more often than menu links do
+
+SKIPPED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.zip', '.mp4', '.mp3', '.doc', '.docx',
+                      '.xls', '.xlsx', '.css', '.js')
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url):
+    """Return the canonical form of a URL so variants of the same page are fetched once.
+
+    Drops the fragment, default ports, tracking parameters and trailing slashes, lowercases scheme and host,
+    and sorts the query string.
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    netloc = host if parsed.port in (None, DEFAULT_PORTS.get(scheme)) else f'{host}:{parsed.port}'
+    path = parsed.path.rstrip('/') or '/'
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+                             if not key.lower().startswith(TRACKING_PARAMS)))
+    return parsed._replace(scheme=scheme, netloc=netloc, path=path, params='', query=query, fragment='').geturl()
+
+
+def link_priority(url, anchor_text='', in_footer=False):
+    """Score how likely the linked page is to hold the company address, higher is better."""
+    haystack = (urlparse(url).path + ' ' + anchor_text).lower().replace(' ', '-')
+    score = 0
+    for pattern, keyword_score in ADDRESS_PAGE_KEYWORDS:
+        if pattern.search(haystack):
+            score = keyword_score
+            break
+    if in_footer:
+        score += FOOTER_BONUS
+    # Prefer shallow pages among equals
+    return score - urlparse(url).path.count('/')
+
+
+class CrawlFrontier:
+    """Bounded priority queue of the pages left to fetch on one domain."""
+
+    def __init__(self, start_url, max_pages=MAX_PAGES_PER_DOMAIN):
+        self.netloc = urlparse(canonicalize_url(start_url)).netloc
+        self.max_pages = max_pages
+        self.fetched = 1  # The start page is already spent
+        self.seen = {canonicalize_url(start_url)}
+        self.queue = []  # (-priority, insertion order, url)
+
+    def add(self, url, anchor_text='', in_footer=False):
+        """Queue an internal link unless its canonical URL was already seen."""
+        url = canonicalize_url(url)
+        parsed = urlparse(url)
+        if parsed.scheme not in DEFAULT_PORTS or parsed.netloc != self.netloc:
+            return
+        if url in self.seen or parsed.path.lower().endswith(SKIPPED_EXTENSIONS):
+            return
+        self.seen.add(url)
+        heapq.heappush(self.queue, (-link_priority(url, anchor_text, in_footer), len(self.seen), url))
+
+    def next_batch(self, size):
+        """Pop up to size best-ranked URLs, within what is left of the page budget."""
+        size = min(size, self.max_pages - self.fetched, len(self.queue))
+        self.fetched += size
+        return [heapq.heappop(self.queue)[2] for _ in range(size)]
+
+    def __bool__(self):
+        return bool(self.queue) and self.fetched < self.max_pages
@@ -0,0 +1,164 @@
+import contextvars
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+METRICS_PATH = './challenge_1/crawl_metrics.jsonl'  # One JSON line per finished domain
+PROMETHEUS_PATH = './challenge_1/crawl_metrics.prom'  # Run totals in the Prometheus text format
+DOMAIN_TIME_BUDGET = 60  # Seconds a domain is expected to take, slower ones are flagged in the slowest domains report
+SLOWEST_DOMAINS = 10  # Domains listed in the slowest domains report
+DOMAIN_SECONDS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)  # Histogram buckets of the domain wall time
+
+# Metrics of the domain crawled by the current task, asyncio copies it into the tasks a domain starts
+current_domain = contextvars.ContextVar('current_domain', default=None)
+
+
+class DomainMetrics:
+    """Wall time per stage and counters of one domain."""
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.started = time.perf_counter()
+        self.seconds = None  # Wall time of the whole domain, set when it finishes
+        self.status = None
+        self.stages = Counter()  # Stage -> seconds, stages running concurrently each count their own time
+        self.counters = Counter()  # pages, bytes, cache_hits, requests
+
+    def as_dict(self):
+        return {'domain': self.domain, 'status': self.status, 'seconds': round(self.seconds, 4),
+                'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+                **self.counters}
+
+    def slowest_stage(self):
+        """Return the stage the domain spent the most time in, or None if nothing was timed."""
+        return max(self.stages, key=self.stages.get) if self.stages else None
+
+
+def add_stage_time(stage, seconds):
+    """Add time spent in a stage to the domain of the current task, if any."""
+    metrics = current_domain.get()
+    if metrics is not None:
+        metrics.stages[stage] += seconds
+
+
+def count(name, amount=1):
+    """Add to a counter of the domain of the current task, if any."""
+    metrics = current_domain.get()
+    if metrics is not None:
+        metrics.counters[name] += amount
+
+
+@contextmanager
+def timed(stage):
+    """Time the block as a stage of the domain of the current task."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, time.perf_counter() - start)
+
+
+class CrawlMetrics:
+    """Per-domain and per-stage metrics of a run, streamed to JSON lines and summed up for Prometheus."""
+
+    def __init__(self, path=METRICS_PATH, prometheus_path=PROMETHEUS_PATH, budget=DOMAIN_TIME_BUDGET):
+        self.path = path
+        self.prometheus_path = prometheus_path
+        self.budget = budget
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+        self.stages = Counter()  # Stage -> seconds over every domain
+        self.run_stages = Counter()  # Stages outside any domain, like the Excel report
+        self.counters = Counter()
+        self.statuses = Counter()
+        self.domain_buckets = Counter()  # Bucket upper bound -> domains finishing within it
+        self.domain_seconds = 0.0
+        self.slowest = []  # The slowest DomainMetrics, longest first
+
+    def start_domain(self, domain):
+        """Start timing a domain, making it the current domain of the calling task."""
+        metrics = DomainMetrics(domain)
+        current_domain.set(metrics)
+        return metrics
+
+    def finish_domain(self, metrics, status):
+        """Close the metrics of a finished domain, add them to the run totals and write its JSON line."""
+        metrics.seconds = time.perf_counter() - metrics.started
+        metrics.status = status
+        self.stages.update(metrics.stages)
+        self.counters.update(metrics.counters)
+        self.statuses[status] += 1
+        self.domain_seconds += metrics.seconds
+        for bound in DOMAIN_SECONDS_BUCKETS:
+            if metrics.seconds <= bound:
+                self.domain_buckets[bound] += 1
+                break
+
+        if len(self.slowest) < SLOWEST_DOMAINS or metrics.seconds > self.slowest[-1].seconds:
+            self.slowest.append(metrics)
+            self.slowest.sort(key=lambda slow: slow.seconds, reverse=True)
+            del self.slowest[SLOWEST_DOMAINS:]
+
+        if self.file:
+            self.file.write(json.dumps(metrics.as_dict()) + '\n')
+            self.file.flush()
+
+    @contextmanager
+    def timed_run_stage(self, stage):
+        """Time a stage of the run that belongs to no domain."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.run_stages[stage] += time.perf_counter() - start
+
+    def add_counters(self, counters):
+        """Add run-level counters, like the geocoder calls."""
+        self.counters.update(counters)
+
+    def prometheus_text(self):
+        """Return the run totals in the Prometheus text exposition format."""
+        lines = ['# HELP crawl_stage_seconds_total Time spent in each stage, summed over domains, plus the run-level stages.',
+                 '# TYPE crawl_stage_seconds_total counter']
+        for stage, seconds in sorted((self.stages + self.run_stages).items()):
+            lines.append(f'crawl_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}')
+        lines += ['# HELP crawl_domains_total Domains finished, by result status.',
+                  '# TYPE crawl_domains_total counter']
+        for status, total in sorted(self.statuses.items()):
+            lines.append(f'crawl_domains_total{{status="{status}"}} {total}')
+        for name, total in sorted(self.counters.items()):
+            lines += [f'# TYPE crawl_{name}_total counter', f'crawl_{name}_total {total}']
+
+        lines += ['# HELP crawl_domain_seconds Wall time of a domain, probe to result.',
+                  '# TYPE crawl_domain_seconds histogram']
+        cumulative = 0
+        for bound in DOMAIN_SECONDS_BUCKETS:
+            cumulative += self.domain_buckets[bound]
+            lines.append(f'crawl_domain_seconds_bucket{{le="{bound}"}} {cumulative}')
+        total = sum(self.statuses.values())
+        lines += [f'crawl_domain_seconds_bucket{{le="+Inf"}} {total}',
+                  f'crawl_domain_seconds_sum {self.domain_seconds:.6f}',
+                  f'crawl_domain_seconds_count {total}']
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self):
+        """Write the run totals to the Prometheus text file."""
+        if self.prometheus_path:
+            with open(self.prometheus_path, 'w', encoding='utf-8') as file:
+                file.write(self.prometheus_text())
+
+    def slowest_report(self):
+        """Return the slowest domains with the stage each of them spent most of its time in."""
+        lines = [f"===== Slowest domains (budget {self.budget} s) ====="]
+        for metrics in self.slowest:
+            stage = metrics.slowest_stage()
+            stage_time = f"{stage} {metrics.stages[stage]:.1f} s" if stage else "no stage timed"
+            flag = " OVER BUDGET" if self.budget is not None and metrics.seconds > self.budget else ""
+            lines.append(f"{metrics.domain}: {metrics.seconds:.1f} s, {metrics.counters['pages']} pages, "
+                         f"{metrics.counters['bytes']:,} bytes, slowest stage: {stage_time}{flag}")
+        return '\n'.join(lines)
+
+    def close(self):
+        self.write_prometheus()
+        if self.file:
+            self.file.close()
@@ -0,0 +1,15 @@
+"""Default limits and paths of the crawl, apart from the aiohttp modules so challenge1 reads them without importing
+aiohttp.
+"""
+
+MAX_CONCURRENCY = 100  # Maximum number of requests in flight across all domains
+PER_HOST_CONCURRENCY = 4  # Maximum number of requests in flight to a single host
+POOL_SIZE = 100  # Maximum number of open connections kept by the pool
+POOL_SIZE_PER_HOST = 4  # Maximum number of open connections to a single host
+MAX_PAGE_BYTES = 1024 * 1024  # Bytes read from a page body at most, the rest of a longer page is left unread
+DOMAIN_BUDGET = 60  # Seconds a domain may take, probe and every subpage included, None for no limit
+# Bytes of page bodies and their text a domain holds at once, counted as bytes read, None for no limit
+DOMAIN_MEMORY_LIMIT = 8 * 1024 * 1024
+BUDGET_EXHAUSTED = 'Budget Exhausted'  # Status of a domain that ran out of time before it was done
+
+SITE_MEMORY_PATH = './challenge_1/site_memory.json'  # Working scheme and redirect target of each domain
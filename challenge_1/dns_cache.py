@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DNS_CACHE_PATH = './challenge_1/dns_cache.json'  # Addresses of every domain resolved, and of those that do not resolve
+DNS_WORKERS = 64  # getaddrinfo calls running at once during the pre-pass
+RESOLVED_TTL = 24 * 3600  # Seconds an answer is kept, getaddrinfo does not tell the record TTL
+UNRESOLVABLE_TTL = 6 * 3600  # Seconds a domain that does not exist is kept as such
+
+# getaddrinfo errors meaning the name has no address, anything else (EAI_AGAIN, timeouts) is retried by the crawl
+UNRESOLVABLE_ERRORS = {socket.EAI_NONAME, getattr(socket, 'EAI_NODATA', socket.EAI_NONAME)}
+
+
+def normalize_host(host):
+    return host.strip().lower().rstrip('.')
+
+
+class DnsCache:
+    """On-disk cache of DNS answers, negative ones included, filled in bulk before the crawl.
+
+    Entries are host -> [expiry time, [[family, address], ...]], an empty address list marks a host that does not
+    resolve. Expired entries are dropped on load.
+    """
+
+    def __init__(self, path=DNS_CACHE_PATH, workers=DNS_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.entries = {}
+        self.load()
+
+    def lookup(self, host):
+        """Return the cached (family, address) pairs of a host, [] if it does not resolve, None if not cached."""
+        entry = self.entries.get(normalize_host(host))
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def is_unresolvable(self, host):
+        return self.lookup(host) == []
+
+    def store(self, host, addresses):
+        ttl = RESOLVED_TTL if addresses else UNRESOLVABLE_TTL
+        self.entries[normalize_host(host)] = [time.time() + ttl, [list(address) for address in addresses]]
+
+    def resolve_now(self, host):
+        """Resolve a host with getaddrinfo and cache the answer, blocking; transient failures are not cached."""
+        try:
+            infos = socket.getaddrinfo(host, 80, type=socket.SOCK_STREAM, flags=socket.AI_ADDRCONFIG)
+        except socket.gaierror as e:
+            if e.errno in UNRESOLVABLE_ERRORS:
+                self.store(host, [])
+            return
+        except UnicodeError:
+            # Names that are not valid hostnames at all never resolve
+            self.store(host, [])
+            return
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            if [family, sockaddr[0]] not in addresses:
+                addresses.append([family, sockaddr[0]])
+        self.store(host, addresses)
+
+    async def resolve_all(self, hosts):
+        """Resolve every host not cached yet, at most workers at once.
+
+        Returns the number of hosts that do not resolve. The cache is saved by the caller once the run is done.
+        """
+        pending = list(dict.fromkeys(normalize_host(host) for host in hosts if self.lookup(host) is None))
+        if pending:
+            loop = asyncio.get_running_loop()
+            # A pool of its own, so the pre-pass does not queue behind or starve the default executor
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dns') as executor:
+                await asyncio.gather(*(loop.run_in_executor(executor, self.resolve_now, host) for host in pending))
+        return sum(self.is_unresolvable(host) for host in hosts)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                now = time.time()
+                self.entries = {host: entry for host, entry in json.load(file).items() if entry[0] >= now}
+        except (OSError, ValueError) as e:
+            print(f"Could not load the DNS cache from {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as file:
+                json.dump(self.entries, file)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            print(f"Could not save the DNS cache to {self.path}: {e}")
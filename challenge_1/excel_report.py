@@ -0,0 +1,179 @@
+import csv
+import re
+import sys
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from openpyxl.styles import PatternFill, Alignment, NamedStyle
+
+from .checkpoint_store import load_results, CHECKPOINT_PATH
+from .run_stats import RunStats
+
+RESULTS_PATH = './challenge_1/results.xlsx'  # Excel report built from the checkpoint store
+RESULT_COLUMNS = ['Domain', 'URL', 'Status', 'Validated with GeoPy']  # Further keys of the records follow these
+MAX_COLUMN_WIDTH = 50  # Set max width for columns
+COLUMNAR_BATCH_SIZE = 10000  # Rows per Parquet record batch
+
+# Colors of the result rows by status, other statuses are unreachable
+STATUS_COLORS = {
+    'Reachable': 'C6EFCE',  # Light Green
+    'Reachable - No Addresses': 'D9D9D9',  # Light Gray
+    'Budget Exhausted': 'FFEB9C',  # Light Yellow
+}
+UNREACHABLE_COLOR = 'FFC7CE'  # Light Red
+
+HYPERLINK = re.compile(r'=HYPERLINK\("([^"]*)"')
+ADDRESS_FIELDS = ['country', 'state', 'city', 'postcode', 'street', 'number']  # Fields of the usaddress tuples
+
+
+def cell_value(value):
+    """Return the value written to a cell, lists of addresses are written as their text like pandas did."""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+class ReportLayout:
+    """Columns and column widths of the report, updated one result at a time so no pass over the rows is needed."""
+
+    def __init__(self):
+        self.widths = {name: len(name) for name in RESULT_COLUMNS}  # Column -> longest text, in column order
+
+    def add(self, result):
+        for name, value in result.items():
+            value = cell_value(value)
+            length = len(str(value)) if value is not None else 0
+            if length > self.widths.setdefault(name, len(name)):
+                self.widths[name] = length
+
+    def columns(self):
+        return list(self.widths)
+
+
+def stats_rows(stats):
+    """Return the rows of the statistics table written below the results, from the run aggregates."""
+    rows = [
+        ('Reachable sites', stats.count('Reachable')),
+        ('Unreachable sites', stats.count('Unreachable')),
+        ('Reachable but no addresses', stats.count('Reachable - No Addresses')),
+        ('Reachable with validated address', stats.validated),
+        ('Out of time budget', stats.count('Budget Exhausted')),
+    ]
+    return [(metric, count, f'{stats.percentage(count):.2f}%') for metric, count in rows] + [
+        ('Total sites checked', stats.results, None)]
+
+
+# Save the results to an Excel file
+def save_results_to_excel(results, output_path=RESULTS_PATH, layout=None, stats=None):
+    """Stream the results to an Excel file in one pass, with row colors by status and the statistics below.
+
+    layout, a ReportLayout, and stats, a RunStats, both fed with every result as it finished, save working out
+    the column widths and the statistics here.
+    """
+    if layout is None:
+        layout = ReportLayout()
+        for result in results:
+            layout.add(result)
+    columns = layout.columns()
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Results')
+
+    # Write-only sheets need their widths before the first row
+    for col_num, width in enumerate(layout.widths.values(), start=1):
+        worksheet.column_dimensions[get_column_letter(col_num)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+    # Named styles are registered once and shared by every cell, instead of a fill object per cell
+    no_wrap = Alignment(wrap_text=False)  # Ensure text is not wrapped in each cell
+    workbook.add_named_style(NamedStyle(name='no_wrap', alignment=no_wrap))
+    for color in list(STATUS_COLORS.values()) + [UNREACHABLE_COLOR]:
+        fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+        workbook.add_named_style(NamedStyle(name=f'fill_{color}', fill=fill, alignment=no_wrap))
+
+    def styled_row(values, style):
+        row = []
+        for value in values:
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.style = style
+            row.append(cell)
+        return row
+
+    worksheet.append(styled_row(columns, 'no_wrap'))
+
+    counted = stats is None
+    if counted:
+        stats = RunStats()
+    for result in results:
+        status = result['Status']
+        if counted:
+            stats.add(result)
+        style = f'fill_{STATUS_COLORS.get(status, UNREACHABLE_COLOR)}'
+        worksheet.append(styled_row([cell_value(result.get(name)) for name in columns], style))
+
+    # Statistics below the results after one empty row, the first three metrics colored like their rows
+    worksheet.append([])
+    worksheet.append(['Metric', 'Count', 'Percentage'])
+    stat_colors = ['Reachable', None, 'Reachable - No Addresses']
+    for row_num, row in enumerate(stats_rows(stats)):
+        if row_num < len(stat_colors):
+            row = styled_row(row, f'fill_{STATUS_COLORS.get(stat_colors[row_num], UNREACHABLE_COLOR)}')
+        worksheet.append(row)
+
+    workbook.save(output_path)
+
+
+def columnar_rows(results):
+    """Yield one row per validated address of each result, or one row without address for the others.
+
+    Addresses are split into typed columns: strings for the components (ZIP codes keep their leading zeros),
+    a boolean for validation and the position of the address within its domain.
+    """
+    for result in results:
+        link = HYPERLINK.match(result.get('URL') or '')
+        base = {'domain': result['Domain'], 'url': link.group(1) if link else result.get('URL'),
+                'status': result['Status'], 'canonical_site': result.get('Canonical Site')}
+        validated = result.get('Validated with GeoPy')
+        addresses = validated if isinstance(validated, (list, tuple)) and validated else [None]
+        for index, address in enumerate(addresses):
+            row = dict(base, validated=address is not None, address_index=index if address is not None else None)
+            row.update(zip(ADDRESS_FIELDS, address) if address is not None else dict.fromkeys(ADDRESS_FIELDS))
+            yield row
+
+
+def save_results_columnar(results, output_path):
+    """Write the results to a Parquet or CSV file, chosen by extension, with typed address columns."""
+    rows = columnar_rows(results)
+    if output_path.endswith('.csv'):
+        with open(output_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=['domain', 'url', 'status', 'canonical_site', 'validated',
+                                                      'address_index'] + ADDRESS_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return
+
+    import pyarrow as pa  # Only needed for Parquet output
+    import pyarrow.parquet as pq
+    schema = pa.schema([('domain', pa.string()), ('url', pa.string()), ('status', pa.string()),
+                        ('canonical_site', pa.string()), ('validated', pa.bool_()), ('address_index', pa.int16())]
+                       + [(field, pa.string()) for field in ADDRESS_FIELDS])
+    with pq.ParquetWriter(output_path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == COLUMNAR_BATCH_SIZE:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+
+
+if __name__ == "__main__":
+    # Build the Excel report on demand from whatever the checkpoint store holds
+    # python -m challenge_1.excel_report [results.parquet or results.csv]
+    results = load_results(CHECKPOINT_PATH)
+    save_results_to_excel(results)
+    print(f"Saved {len(results)} results to {RESULTS_PATH}")
+    if len(sys.argv) > 1:
+        save_results_columnar(results, sys.argv[1])
+        print(f"Saved {len(results)} results to {sys.argv[1]}")
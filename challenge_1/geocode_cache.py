@@ -0,0 +1,197 @@
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+
+GEOCODE_CACHE_PATH = './challenge_1/geocode_cache.sqlite'  # On-disk cache of geocoding answers
+GEOCODE_TTL = 30 * 24 * 3600  # Seconds a found address stays cached
+GEOCODE_NEGATIVE_TTL = 7 * 24 * 3600  # Seconds an address the geocoder could not find stays cached
+GEOCODE_CACHE_SIZE = 100000  # Maximum number of cached addresses, least recently used are evicted first
+GEOCODE_MIN_DELAY = 1.0  # Seconds between two live geocoder calls (Nominatim allows one per second)
+
+
+def normalize_address(formatted_address):
+    """Return the cache key of an address: lowercase, single spaces, no stray separators."""
+    key = formatted_address.lower()
+    key = re.sub(r'\s*,\s*', ', ', key)  # One space after every comma
+    key = re.sub(r'(, )+', ', ', key)  # Drop the empty components left by missing fields
+    key = ' '.join(key.split())
+    return key.strip(' ,')
+
+
+class GeocodeCache:
+    """SQLite cache of geocoding answers, including addresses that were not found."""
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_TTL, negative_ttl=GEOCODE_NEGATIVE_TTL,
+                 max_entries=GEOCODE_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()  # The cache is shared by the crawl worker threads
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS geocodes ('
+            'key TEXT PRIMARY KEY, result TEXT, created REAL NOT NULL, last_used REAL NOT NULL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS geocodes_last_used ON geocodes (last_used)')
+        self.connection.commit()
+        self.entries = self.connection.execute('SELECT COUNT(*) FROM geocodes').fetchone()[0]
+
+    def get(self, key):
+        """Return (True, result) for a fresh cached answer, result being None for a negative one, or (False, None)."""
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute('SELECT result, created FROM geocodes WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return False, None
+
+            result, created = row
+            ttl = self.ttl if result is not None else self.negative_ttl
+            if now - created > ttl:
+                # Expired, forget it so the address is geocoded again
+                self.connection.execute('DELETE FROM geocodes WHERE key = ?', (key,))
+                self.connection.commit()
+                self.entries -= 1
+                return False, None
+
+            self.connection.execute('UPDATE geocodes SET last_used = ? WHERE key = ?', (now, key))
+            self.connection.commit()
+            return True, json.loads(result) if result is not None else None
+
+    def put(self, key, result):
+        """Cache the answer for an address, None meaning the geocoder did not find it."""
+        now = time.time()
+        stored = json.dumps(result) if result is not None else None
+        with self.lock:
+            existing = self.connection.execute('SELECT 1 FROM geocodes WHERE key = ?', (key,)).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)', (key, stored, now, now))
+            if existing is None:
+                self.entries += 1
+
+            # Evict the least recently used addresses once the cache is over its size
+            if self.entries > self.max_entries:
+                overflow = self.entries - self.max_entries
+                self.connection.execute(
+                    'DELETE FROM geocodes WHERE key IN (SELECT key FROM geocodes ORDER BY last_used LIMIT ?)',
+                    (overflow,))
+                self.entries -= overflow
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class GeocodingService:
+    """Answers geocoding requests from the cache, sending misses to the geocoder through a rate-limited background queue."""
+
+    def __init__(self, geolocator, cache, min_delay=GEOCODE_MIN_DELAY, cache_only=False):
+        self.geolocator = geolocator
+        self.cache = cache
+        self.min_delay = min_delay
+        self.cache_only = cache_only  # Answer misses with None instead of calling the geocoder
+        self.pending = queue.Queue()  # (key, formatted address) waiting for the geocoder
+        self.in_flight = {}  # Key -> future shared by every request for the same address
+        self.lock = threading.Lock()
+        self.cache_hits = 0  # Requests answered from the cache without queueing
+        self.geocoder_calls = 0  # Requests sent to the geocoder
+        self.geocoder_seconds = 0.0  # Time spent waiting on the geocoder, rate-limit sleeps excluded
+        self.worker = threading.Thread(target=self.run, name='geocoder', daemon=True)
+        self.worker.start()
+
+    def submit(self, formatted_address):
+        """Return a future resolving to the location dict of the address, or None if it could not be validated."""
+        future = Future()
+        if not formatted_address:
+            future.set_result(None)
+            return future
+
+        key = normalize_address(formatted_address)
+        found, result = self.cache.get(key)
+        if found or self.cache_only:
+            if found:
+                with self.lock:
+                    self.cache_hits += 1
+            future.set_result(result)
+            return future
+
+        with self.lock:
+            # The same address queued by another website shares the pending answer
+            if key in self.in_flight:
+                return self.in_flight[key]
+            self.in_flight[key] = future
+        self.pending.put((key, formatted_address))
+        return future
+
+    def geocode(self, formatted_address):
+        """Geocode an address and wait for the answer."""
+        return self.submit(formatted_address).result()
+
+    def run(self):
+        """Worker loop, calls the geocoder at most once every min_delay seconds."""
+        last_call = 0.0
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            key, formatted_address = item
+
+            # Another request may have filled the cache while this one was queued
+            found, result = self.cache.get(key)
+            if not found:
+                wait = self.min_delay - (time.monotonic() - last_call)
+                if wait > 0:
+                    time.sleep(wait)
+                last_call = time.monotonic()
+                self.geocoder_calls += 1
+                try:
+                    location = self.geolocator.geocode(formatted_address)
+                    result = {"latitude": location.latitude, "longitude": location.longitude,
+                              "address": location.address} if location else None
+                    self.cache.put(key, result)
+                except (GeocoderTimedOut, GeocoderServiceError) as e:
+                    # Service errors are not answers, leave them out of the cache so the address is retried later
+                    print(f"Geocoding error for {formatted_address}: {e}")
+                    result = None
+                except Exception as e:
+                    print(f"Unexpected geocoding error for {formatted_address}: {e}")
+                    result = None
+                self.geocoder_seconds += time.monotonic() - last_call
+
+            with self.lock:
+                future = self.in_flight.pop(key)
+            future.set_result(result)
+
+    def stats(self):
+        """Return the cache and geocoder counters of the service."""
+        return {'geocode_cache_hits': self.cache_hits, 'geocoder_calls': self.geocoder_calls}
+
+    def close(self):
+        """Stop the worker once every queued address has been answered."""
+        self.pending.put(None)
+        self.worker.join()
+
+
+StubLocation = namedtuple('StubLocation', ['latitude', 'longitude', 'address'])
+
+
+class StubGeocoder:
+    """Local stand-in for Nominatim, answers from a dict of known addresses without touching the network."""
+
+    def __init__(self, known_addresses=None):
+        # Normalized address -> (latitude, longitude)
+        self.known_addresses = {normalize_address(address): coords for address, coords in (known_addresses or {}).items()}
+        self.calls = 0
+
+    def geocode(self, query):
+        self.calls += 1
+        coords = self.known_addresses.get(normalize_address(query))
+        if coords is None:
+            return None
+        return StubLocation(coords[0], coords[1], query)
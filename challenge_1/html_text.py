@@ -0,0 +1,77 @@
+from importlib.util import find_spec
+
+# lxml is optional, BeautifulSoup is used without it; it is imported on first use, by the worker processes
+HAVE_LXML = find_spec('lxml') is not None
+
+NOISE_TAGS = ('script', 'style', 'noscript')  # Never hold visible text
+
+# Elements ending a block of text, a newline is added after each so the text keeps one block per line
+BLOCK_TAGS = ('address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'footer', 'form', 'h1', 'h2',
+              'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'td',
+              'th', 'tr', 'ul')
+
+
+def is_footer_marker(tag_name, tag_id, tag_classes):
+    """Return True if an element is a footer, by tag name, id or class."""
+    if tag_name == 'footer':
+        return True
+    return 'footer' in ' '.join([tag_id or ''] + list(tag_classes)).lower()
+
+
+def extract_with_lxml(html):
+    """Return the visible text and the (href, anchor text, in footer) links of a page, parsed with lxml."""
+    import lxml.html
+    from lxml import etree
+
+    if not html.strip():
+        return '', []
+    try:
+        # Parse bytes so pages declaring their own encoding are accepted
+        root = lxml.html.fromstring(html.encode('utf-8'), parser=lxml.html.HTMLParser(encoding='utf-8'))
+    except (etree.ParserError, ValueError):
+        return '', []
+    etree.strip_elements(root, *NOISE_TAGS, with_tail=False)
+    for element in root.iter(*BLOCK_TAGS):
+        element.tail = '\n' + (element.tail or '')
+
+    links = []
+    for link in root.iter('a'):
+        href = link.get('href')
+        if href is None:
+            continue
+        in_footer = any(is_footer_marker(parent.tag, parent.get('id'), (parent.get('class') or '').split())
+                        for parent in link.iterancestors())
+        links.append((href, ' '.join(link.text_content().split()), in_footer))
+    return root.text_content(), links
+
+
+def extract_with_bs4(html):
+    """Return the visible text and the (href, anchor text, in footer) links of a page, parsed with BeautifulSoup.
+
+    Slower than lxml, kept as a fallback and to compare results against.
+    """
+    from bs4 import BeautifulSoup  # Only needed by this backend
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    for tag in soup(BLOCK_TAGS):
+        tag.insert_after('\n')
+
+    links = []
+    for link in soup.find_all('a', href=True):
+        in_footer = any(is_footer_marker(parent.name, parent.get('id'), parent.get('class') or [])
+                        for parent in link.parents if parent.attrs or parent.name == 'footer')
+        links.append((link['href'], link.get_text(' ', strip=True), in_footer))
+    return soup.get_text(), links
+
+
+BACKENDS = {'lxml': extract_with_lxml, 'bs4': extract_with_bs4}
+DEFAULT_BACKEND = 'lxml' if HAVE_LXML else 'bs4'
+
+
+def extract_page(html, backend=DEFAULT_BACKEND):
+    """Return the visible text and links of a page using the chosen backend."""
+    if backend == 'lxml' and not HAVE_LXML:
+        backend = 'bs4'
+    return BACKENDS[backend](html)
@@ -0,0 +1,327 @@
+import asyncio
+import codecs
+import json
+import os
+import socket
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import ThreadedResolver
+
+from .crawl_metrics import count
+from .crawl_settings import (MAX_CONCURRENCY, PER_HOST_CONCURRENCY, POOL_SIZE, POOL_SIZE_PER_HOST, MAX_PAGE_BYTES,
+                             SITE_MEMORY_PATH)
+from .dns_cache import UNRESOLVABLE_ERRORS
+from .page_cache import PageCache, PAGE_CACHE_DIR
+
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle connection is kept open for reuse
+DNS_CACHE_TTL = 300  # Seconds a resolved host is cached by the pool
+CONNECT_TIMEOUT = 10  # Seconds to open a connection, waiting for a pool slot not included
+READ_TIMEOUT = 20  # Seconds to wait for the next chunk of a response
+HOST_FAILURE_LIMIT = 3  # Consecutive failed requests after which a host is given up on
+HOST_BREAKER_COOLDOWN = 300  # Seconds before a given-up host is tried again
+READ_CHUNK_SIZE = 64 * 1024  # Bytes decoded at a time while a page streams in
+# Content types read as pages, a missing Content-Type is read too; PDFs, images and videos are not downloaded
+PAGE_CONTENT_TYPES = {'text/html', 'application/xhtml+xml', 'text/plain', ''}
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.82 Safari/537.36'}
+
+
+class CrawlLimiter:
+    """Global and per-host concurrency limits shared by every request of a crawl."""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, per_host_concurrency=PER_HOST_CONCURRENCY):
+        self.global_semaphore = asyncio.Semaphore(max_concurrency)
+        self.per_host_concurrency = per_host_concurrency
+        self.host_semaphores = {}  # Host -> semaphore, created on first use
+
+    def host_semaphore(self, host):
+        """Return the semaphore limiting requests to the given host."""
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self.host_semaphores[host]
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """Wait for a free per-host slot, then a free global slot, for the given URL."""
+        # Queue on the host first so requests waiting on a busy host do not hold global slots
+        async with self.host_semaphore(urlparse(url).netloc):
+            async with self.global_semaphore:
+                yield
+
+
+class CacheMiss(aiohttp.ClientError):
+    """Raised in cache-only mode for a URL that is not in the page cache."""
+
+
+class SkippedPage(aiohttp.ClientError):
+    """Raised for a response whose Content-Type shows it is not a web page, before its body is read."""
+
+
+class HostUnavailable(aiohttp.ClientError):
+    """Raised without sending a request to a host that failed too many times in a row."""
+
+
+class HostBreaker:
+    """Counts the consecutive failures of each host and gives up on a host after too many of them.
+
+    A host given up on is tried again once the cooldown has passed, a new failure gives up on it again.
+    """
+
+    def __init__(self, failure_limit=HOST_FAILURE_LIMIT, cooldown=HOST_BREAKER_COOLDOWN):
+        self.failure_limit = failure_limit
+        self.cooldown = cooldown
+        self.failures = {}  # Host -> consecutive failures
+        self.opened = {}  # Host -> time it was given up on
+
+    def is_open(self, host):
+        """Return True if requests to the host should fail without being sent."""
+        opened = self.opened.get(host)
+        if opened is None:
+            return False
+        if time.monotonic() - opened > self.cooldown:
+            # Let the next request through, its outcome decides
+            del self.opened[host]
+            self.failures[host] = self.failure_limit - 1
+            return False
+        return True
+
+    def record(self, host, failed):
+        """Count the outcome of a request to the host."""
+        if not failed:
+            self.failures.pop(host, None)
+            return
+        self.failures[host] = self.failures.get(host, 0) + 1
+        if self.failures[host] >= self.failure_limit:
+            self.opened[host] = time.monotonic()
+
+
+class CachedResolver(AbstractResolver):
+    """aiohttp resolver answering from the DNS cache, hosts not cached yet are resolved as usual and cached."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.fallback = None  # Created on first use, it needs the running loop
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        addresses = self.cache.lookup(host)
+        if addresses == []:
+            raise socket.gaierror(socket.EAI_NONAME, f"{host} does not resolve (cached)")
+        if addresses is None:
+            if self.fallback is None:
+                self.fallback = ThreadedResolver()
+            try:
+                results = await self.fallback.resolve(host, port, family)
+            except socket.gaierror as e:
+                if e.errno in UNRESOLVABLE_ERRORS:
+                    self.cache.store(host, [])
+                raise
+            self.cache.store(host, [(result['family'], result['host']) for result in results])
+            return results
+
+        return [{'hostname': host, 'host': address, 'port': port, 'family': address_family, 'proto': 0,
+                 'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV}
+                for address_family, address in addresses if family in (socket.AF_UNSPEC, address_family)]
+
+    async def close(self):
+        if self.fallback is not None:
+            await self.fallback.close()
+
+
+def origin_of(url):
+    """Return the scheme://host part of a URL."""
+    parsed = urlparse(url)
+    return f'{parsed.scheme}://{parsed.netloc}'
+
+
+class HttpClient:
+    """Pooled keep-alive HTTP client used by every fetch of a crawl."""
+
+    def __init__(self, limiter=None, pool_size=POOL_SIZE, pool_size_per_host=POOL_SIZE_PER_HOST,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, site_memory_path=SITE_MEMORY_PATH,
+                 page_cache_dir=PAGE_CACHE_DIR, cache_only=False, resolver=None, breaker=None,
+                 max_page_bytes=MAX_PAGE_BYTES):
+        self.limiter = limiter or CrawlLimiter()
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.site_memory_path = site_memory_path
+        self.page_cache_dir = page_cache_dir  # None disables the page cache
+        self.cache_only = cache_only  # Answer every request from the page cache, never touching the network
+        self.resolver = resolver  # aiohttp resolver used by the pool, None for the default one
+        self.breaker = breaker or HostBreaker()
+        self.max_page_bytes = max_page_bytes
+        self.page_cache = None
+        self.site_origins = {}  # Domain -> origin that answered last time, after redirects
+        self.host_aliases = {}  # Host seen for a domain -> origin to use instead
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size_per_host,
+                                         keepalive_timeout=self.keepalive_timeout, ttl_dns_cache=DNS_CACHE_TTL,
+                                         resolver=self.resolver)
+        # No total timeout per request, the domain budget bounds every request of a domain instead
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, headers=HEADERS, timeout=timeout)
+        if self.page_cache_dir or self.cache_only:
+            self.page_cache = PageCache(self.page_cache_dir or PAGE_CACHE_DIR)
+        self.load_site_memory()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        if self.page_cache:
+            self.page_cache.close()
+        self.save_site_memory()
+
+    @asynccontextmanager
+    async def get(self, url, **kwargs):
+        """Send a GET request through the pool once the limiter grants a slot.
+
+        Connection errors, connect and read timeouts and 5xx answers count against the host, which is given up on after
+        too many. A total timeout is the caller's deadline running out, e.g. the domain budget, not the host failing.
+        """
+        host = urlparse(url).netloc
+        if self.breaker.is_open(host):
+            raise HostUnavailable(f"Giving up on {host} after {self.breaker.failure_limit} failed requests")
+        async with self.limiter.slot(url):
+            count('requests')
+            try:
+                async with self.session.get(url, **kwargs) as response:
+                    self.breaker.record(host, failed=response.status >= 500)
+                    yield response
+            except aiohttp.ClientConnectionError:
+                # Includes the sock_connect and sock_read timeouts (ServerTimeoutError), not the plain TimeoutError of
+                # the total timeout
+                self.breaker.record(host, failed=True)
+                raise
+
+    async def fetch_status(self, url, **kwargs):
+        """Return the status code and final URL, after redirects, of a reachability probe."""
+        if self.cache_only:
+            probe = self.page_cache.lookup_probe(url)
+            if probe is None:
+                raise CacheMiss(f"No cached probe for {url}")
+            return probe
+
+        async with self.get(url, **kwargs) as response:
+            status, final_url = response.status, str(response.url)
+        if self.page_cache:
+            self.page_cache.store_probe(url, status, final_url)
+        return status, final_url
+
+    async def fetch_page(self, url, max_bytes=None, **kwargs):
+        """Return the status code, final URL and decoded body of a page.
+
+        A cached page is revalidated with a conditional request and a 304 answer is served from disk.
+        The body is streamed and decoded as it comes in, up to max_bytes (max_page_bytes by default), longer pages are
+        cut there; SkippedPage is raised without reading the body when Content-Type shows it is not a web page.
+        """
+        cached = self.page_cache.lookup(url) if self.page_cache else None
+        cached_body = self.page_cache.read_body(cached['body_hash']) if cached else None
+
+        if self.cache_only:
+            if cached_body is None:
+                raise CacheMiss(f"No cached page for {url}")
+            count('cache_hits')
+            return cached['status'], cached['final_url'], cached_body
+
+        headers = {}
+        if cached_body is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        async with self.get(url, headers=headers, **kwargs) as response:
+            if response.status == 304 and cached_body is not None:
+                # Unchanged since the last run, serve the stored body
+                self.page_cache.touch(url)
+                count('cache_hits')
+                return cached['status'], cached['final_url'], cached_body
+
+            text = await self.read_text(response, max_bytes or self.max_page_bytes)
+            status, final_url = response.status, str(response.url)
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+        if self.page_cache:
+            self.page_cache.store(url, final_url, status, etag, last_modified, text)
+        return status, final_url, text
+
+    async def read_text(self, response, max_bytes):
+        """Return the body of a response decoded chunk by chunk, cut at max_bytes."""
+        # aiohttp reports a missing Content-Type as application/octet-stream, so the header itself is checked
+        content_type = response.content_type if response.headers.get('Content-Type') else ''
+        if content_type not in PAGE_CONTENT_TYPES:
+            count('skipped_pages')
+            raise SkippedPage(f"Not a web page ({content_type}): {response.url}")
+
+        charset = response.charset or 'utf-8'
+        try:
+            decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        parts, size = [], 0
+        async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+            chunk = chunk[:max_bytes - size]
+            size += len(chunk)
+            parts.append(decoder.decode(chunk))
+            if size >= max_bytes:
+                # The rest of the page is never downloaded
+                count('truncated_pages')
+                break
+        parts.append(decoder.decode(b'', final=True))
+        count('bytes', size)
+        return ''.join(parts)
+
+    def site_url(self, website):
+        """Return the remembered URL answering for the domain, or None if it is not known yet."""
+        return self.site_origins.get(website)
+
+    def remember_site(self, website, final_url):
+        """Remember the scheme and redirect target that answered for the domain."""
+        origin = origin_of(final_url)
+        self.site_origins[website] = origin
+        self.host_aliases[website] = origin
+        self.host_aliases[urlparse(origin).netloc] = origin
+
+    def forget_site(self, website):
+        """Drop the remembered origin of a domain that stopped answering on it."""
+        origin = self.site_origins.pop(website, None)
+        self.host_aliases.pop(website, None)
+        if origin:
+            self.host_aliases.pop(urlparse(origin).netloc, None)
+
+    def rewrite_url(self, url):
+        """Point a URL on a remembered domain straight at its final origin, skipping the redirect."""
+        parsed = urlparse(url)
+        origin = self.host_aliases.get(parsed.netloc)
+        if origin is None:
+            return url
+        target = urlparse(origin)
+        return parsed._replace(scheme=target.scheme, netloc=target.netloc).geturl()
+
+    def load_site_memory(self):
+        """Load the origins remembered by earlier runs."""
+        if not self.site_memory_path or not os.path.exists(self.site_memory_path):
+            return
+        try:
+            with open(self.site_memory_path, encoding='utf-8') as file:
+                for website, origin in json.load(file).items():
+                    self.remember_site(website, origin)
+        except (OSError, ValueError) as e:
+            print(f"Could not load site memory from {self.site_memory_path}: {e}")
+
+    def save_site_memory(self):
+        """Save the remembered origins for the next run."""
+        # A cache-only run learns nothing new and may have dropped origins it could not probe offline
+        if not self.site_memory_path or self.cache_only:
+            return
+        try:
+            with open(self.site_memory_path, 'w', encoding='utf-8') as file:
+                json.dump(self.site_origins, file)
+        except OSError as e:
+            print(f"Could not save site memory to {self.site_memory_path}: {e}")
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+
+PAGE_CACHE_DIR = './challenge_1/page_cache'  # Page bodies and their validators from earlier runs
+
+
+class PageCache:
+    """Content-addressed on-disk cache of fetched pages with their ETag and Last-Modified validators.
+
+    Bodies are stored once per distinct content under blobs/, an SQLite index maps each URL to its body.
+    """
+
+    def __init__(self, directory=PAGE_CACHE_DIR):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.sqlite'))
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')  # A lost page is simply fetched again
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'url TEXT PRIMARY KEY, final_url TEXT, status INTEGER, etag TEXT, last_modified TEXT, '
+            'body_hash TEXT, fetched REAL)'
+        )
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS probes (url TEXT PRIMARY KEY, status INTEGER, final_url TEXT, fetched REAL)'
+        )
+        self.connection.commit()
+
+    def blob_path(self, body_hash):
+        """Return the file holding the body with the given hash, fanned out over subfolders."""
+        return os.path.join(self.blob_dir, body_hash[:2], body_hash)
+
+    def lookup(self, url):
+        """Return the cached entry of a URL as a dict, or None if it was never fetched."""
+        row = self.connection.execute(
+            'SELECT final_url, status, etag, last_modified, body_hash FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        final_url, status, etag, last_modified, body_hash = row
+        return {'final_url': final_url, 'status': status, 'etag': etag,
+                'last_modified': last_modified, 'body_hash': body_hash}
+
+    def read_body(self, body_hash):
+        """Return the decoded body stored under the given hash, or None if the blob is missing."""
+        try:
+            with open(self.blob_path(body_hash), 'rb') as file:
+                return zlib.decompress(file.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            return None
+
+    def store(self, url, final_url, status, etag, last_modified, text):
+        """Cache a fetched page, writing its body only if that content is not stored yet."""
+        body = text.encode('utf-8')
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a truncated blob behind
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(zlib.compress(body))
+            os.replace(temp_path, path)
+
+        self.connection.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                (url, final_url, status, etag, last_modified, body_hash, time.time()))
+        self.connection.commit()
+
+    def touch(self, url):
+        """Mark a cached page as confirmed unchanged by the server."""
+        self.connection.execute('UPDATE pages SET fetched = ? WHERE url = ?', (time.time(), url))
+        self.connection.commit()
+
+    def lookup_probe(self, url):
+        """Return the (status, final URL) a reachability probe of the URL got last time, or None."""
+        return self.connection.execute('SELECT status, final_url FROM probes WHERE url = ?', (url,)).fetchone()
+
+    def store_probe(self, url, status, final_url):
+        """Remember the answer of a reachability probe, so cache-only runs know which sites were reachable."""
+        self.connection.execute('INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?)',
+                                (url, status, final_url, time.time()))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
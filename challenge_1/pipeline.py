@@ -0,0 +1,121 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .crawl_metrics import add_stage_time
+from .html_text import extract_page, DEFAULT_BACKEND
+
+CPU_WORKERS = os.cpu_count() or 1  # Processes parsing HTML and extracting addresses
+VALIDATE_WORKERS = 16  # Address batches waiting on the geocoder at once
+STAGE_QUEUE_SIZE = 64  # Items waiting between two stages before the stage feeding them is held back
+
+
+class StagedPipeline:
+    """CPU and validation stages of the crawl, decoupled from the network I/O by bounded queues.
+
+    fetch (crawl workers) -> extract (process pool) -> validate (threads) -> record (one writer).
+    A full queue holds back the stage feeding it, so fetching never runs far ahead of extraction.
+    """
+
+    def __init__(self, extract, validate, on_result, cpu_workers=CPU_WORKERS, validate_workers=VALIDATE_WORKERS,
+                 queue_size=STAGE_QUEUE_SIZE, html_backend=DEFAULT_BACKEND):
+        self.extract = extract  # page texts -> (pyap hits, usaddress tuples, stage -> seconds), must be picklable
+        self.validate = validate  # usaddress tuples -> validated tuples, blocking, runs in the validate threads
+        self.on_result = on_result  # result record -> None, called from a single thread in finishing order
+        self.cpu_workers = cpu_workers
+        self.validate_workers = validate_workers
+        self.queue_size = queue_size
+        self.html_backend = html_backend
+        self.pool = None
+        self.validate_pool = None
+        self.record_pool = None
+        self.tasks = []
+
+    async def __aenter__(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        # Threads of their own, off the default executor: validations blocked on the geocoder queue must not hold
+        # back the DNS lookups aiohttp runs there, and the writer stays a single thread
+        self.validate_pool = ThreadPoolExecutor(max_workers=self.validate_workers, thread_name_prefix='validate')
+        self.record_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='record')
+        self.extract_queue = asyncio.Queue(self.queue_size)
+        self.validate_queue = asyncio.Queue(self.queue_size)
+        self.record_queue = asyncio.Queue(self.queue_size)
+        self.tasks = ([asyncio.create_task(self.extract_worker()) for _ in range(self.cpu_workers)]
+                      + [asyncio.create_task(self.validate_worker()) for _ in range(self.validate_workers)]
+                      + [asyncio.create_task(self.record_worker())])
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Let the writer finish everything already handed to it before stopping the stages
+        if exc_info[0] is None:
+            await self.record_queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.pool.shutdown(cancel_futures=True)
+        self.validate_pool.shutdown(wait=False, cancel_futures=True)
+        self.record_pool.shutdown()
+
+    async def parse_html(self, html):
+        """Return the visible text and links of a page, parsed in the process pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, extract_page, html, self.html_backend)
+
+    async def analyze(self, page_texts):
+        """Send page texts through the extract and validate stages and return (pyap hits, validated addresses).
+
+        The time spent in each stage is added to the metrics of the current domain, the rest as pipeline_wait.
+        """
+        start = time.perf_counter()
+        answer = asyncio.get_running_loop().create_future()
+        await self.extract_queue.put((page_texts, answer))
+        pyap_results, validated, timings = await answer
+        for stage, seconds in timings.items():
+            add_stage_time(stage, seconds)
+        add_stage_time('pipeline_wait', time.perf_counter() - start - sum(timings.values()))
+        return pyap_results, validated
+
+    async def record(self, result):
+        """Hand a finished result record to the record stage."""
+        await self.record_queue.put(result)
+
+    async def extract_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            page_texts, answer = await self.extract_queue.get()
+            try:
+                pyap_results, usaddress_results, timings = await loop.run_in_executor(self.pool, self.extract, page_texts)
+                await self.validate_queue.put((pyap_results, usaddress_results, timings, answer))
+            except Exception as e:
+                if not answer.done():
+                    answer.set_exception(e)
+            finally:
+                self.extract_queue.task_done()
+
+    async def validate_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pyap_results, usaddress_results, timings, answer = await self.validate_queue.get()
+            try:
+                start = time.perf_counter()
+                validated = (await loop.run_in_executor(self.validate_pool, self.validate, usaddress_results)
+                             if usaddress_results else [])
+                timings['validate'] = time.perf_counter() - start
+                if not answer.done():  # The crawl waiting on it may have been cancelled
+                    answer.set_result((pyap_results, validated, timings))
+            except Exception as e:
+                if not answer.done():
+                    answer.set_exception(e)
+            finally:
+                self.validate_queue.task_done()
+
+    async def record_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            result = await self.record_queue.get()
+            try:
+                await loop.run_in_executor(self.record_pool, self.on_result, result)
+            except Exception as e:
+                print(f"Error recording result for {result.get('Domain')}: {e}")
+            finally:
+                self.record_queue.task_done()
@@ -0,0 +1,245 @@
+import bisect
+import bz2
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from collections import Counter
+
+POSTAL_INDEX_PATH = './challenge_1/postal_index.bin'  # Built from the ZIP code data of the zipcodes package (MIT)
+
+# Verdicts of a consistency check
+CONSISTENT = 'consistent'  # ZIP, state and city belong together, validated without the geocoder
+AMBIGUOUS = 'ambiguous'  # Cannot be settled offline, left to the geocoder
+IMPOSSIBLE = 'impossible'  # ZIP unknown or in another state, rejected without the geocoder
+
+MAGIC = b'ZIPIDX02'
+# Magic, ZIP count, city hash count, extra state count, then the byte size of the state code table
+HEADER = struct.Struct('<8sIIII')
+
+US_STATE_NAMES = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA', 'colorado': 'CO',
+    'connecticut': 'CT', 'delaware': 'DE', 'district of columbia': 'DC', 'florida': 'FL', 'georgia': 'GA',
+    'hawaii': 'HI', 'idaho': 'ID', 'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS', 'kentucky': 'KY',
+    'louisiana': 'LA', 'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
+    'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV', 'new hampshire': 'NH',
+    'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC', 'north dakota': 'ND',
+    'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR', 'pennsylvania': 'PA', 'rhode island': 'RI',
+    'south carolina': 'SC', 'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT', 'vermont': 'VT',
+    'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+    'puerto rico': 'PR',
+}
+# FIPS code -> state code, for the county GEOIDs of the Census ZCTA to county relationship file
+STATE_FIPS = {
+    '01': 'AL', '02': 'AK', '04': 'AZ', '05': 'AR', '06': 'CA', '08': 'CO', '09': 'CT', '10': 'DE', '11': 'DC',
+    '12': 'FL', '13': 'GA', '15': 'HI', '16': 'ID', '17': 'IL', '18': 'IN', '19': 'IA', '20': 'KS', '21': 'KY',
+    '22': 'LA', '23': 'ME', '24': 'MD', '25': 'MA', '26': 'MI', '27': 'MN', '28': 'MS', '29': 'MO', '30': 'MT',
+    '31': 'NE', '32': 'NV', '33': 'NH', '34': 'NJ', '35': 'NM', '36': 'NY', '37': 'NC', '38': 'ND', '39': 'OH',
+    '40': 'OK', '41': 'OR', '42': 'PA', '44': 'RI', '45': 'SC', '46': 'SD', '47': 'TN', '48': 'TX', '49': 'UT',
+    '50': 'VT', '51': 'VA', '53': 'WA', '54': 'WV', '55': 'WI', '56': 'WY', '72': 'PR',
+}
+CITY_PREFIXES = {'saint': 'st', 'sainte': 'ste', 'fort': 'ft', 'mount': 'mt'}  # Spelled out or not on websites
+ZIP_CODE = re.compile(r'(\d{5})(?:-?\d{4})?$')
+
+
+def normalize_city(city):
+    """Return the comparable form of a city name, lowercase without punctuation and with short prefixes."""
+    words = re.sub(r"[.\-',]", ' ', city.lower()).split()
+    if words and words[0] in CITY_PREFIXES:
+        words[0] = CITY_PREFIXES[words[0]]
+    return ' '.join(words)
+
+
+def city_hash(city):
+    return zlib.crc32(normalize_city(city).encode('utf-8'))
+
+
+def normalize_state(state):
+    """Return the two-letter code of a state name or abbreviation, or None if it is not a US state."""
+    state = state.strip().rstrip('.')
+    if len(state) == 2 and state.upper() in US_STATE_NAMES.values():
+        return state.upper()
+    return US_STATE_NAMES.get(' '.join(state.lower().split()))
+
+
+class PostalIndex:
+    """ZIP -> state and city lookups over a memory-mapped file of sorted arrays, loaded in milliseconds.
+
+    Layout after the header: ZIP codes (uint32, sorted), city hash offsets per ZIP (uint32, one more than the ZIPs),
+    city hashes (uint32, crc32 of the normalized names), ZIPs crossing state lines (uint32, sorted, once per extra
+    state), state index per ZIP (uint8), state index of each extra state (uint8) and the state codes.
+    """
+
+    def __init__(self, path=POSTAL_INDEX_PATH):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, zip_count, hash_count, extra_count, states_size = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a postal index")
+
+        view = memoryview(self.buffer)
+        offset = HEADER.size
+        self.zips = view[offset:offset + 4 * zip_count].cast('I')
+        offset += 4 * zip_count
+        self.city_offsets = view[offset:offset + 4 * (zip_count + 1)].cast('I')
+        offset += 4 * (zip_count + 1)
+        self.city_hashes = view[offset:offset + 4 * hash_count].cast('I')
+        offset += 4 * hash_count
+        self.extra_zips = view[offset:offset + 4 * extra_count].cast('I')
+        offset += 4 * extra_count
+        self.states = view[offset:offset + zip_count]
+        offset += zip_count
+        self.extra_states = view[offset:offset + extra_count]
+        offset += extra_count
+        self.state_codes = bytes(view[offset:offset + states_size]).decode('ascii').split(',')
+
+        self.verdicts = Counter()
+        self.lock = threading.Lock()
+
+    def find_zip(self, zip_code):
+        """Return the row of a ZIP code, or None if it is not in the index."""
+        row = bisect.bisect_left(self.zips, zip_code)
+        return row if row < len(self.zips) and self.zips[row] == zip_code else None
+
+    def zip_state(self, row):
+        return self.state_codes[self.states[row]]
+
+    def zip_states(self, row):
+        """Return the main state of a ZIP code and the other states it crosses into."""
+        states = [self.zip_state(row)]
+        extra = bisect.bisect_left(self.extra_zips, self.zips[row])
+        while extra < len(self.extra_zips) and self.extra_zips[extra] == self.zips[row]:
+            states.append(self.state_codes[self.extra_states[extra]])
+            extra += 1
+        return states
+
+    def zip_has_city(self, row, city):
+        hashes = self.city_hashes[self.city_offsets[row]:self.city_offsets[row + 1]]
+        return city_hash(city) in hashes
+
+    def check(self, state, city, postcode):
+        """Return CONSISTENT, AMBIGUOUS or IMPOSSIBLE for the state, city and ZIP code of an address."""
+        verdict = self.verdict(state, city, postcode)
+        with self.lock:
+            self.verdicts[verdict] += 1
+        return verdict
+
+    def verdict(self, state, city, postcode):
+        match = ZIP_CODE.match((postcode or '').strip())
+        if not match:
+            return IMPOSSIBLE
+        zip_code = int(match.group(1))
+        state_code = normalize_state(state or '')
+
+        row = self.find_zip(zip_code)
+        if row is None:
+            # ZIPs newer than the data exist, keep the ones whose 3-digit area is in the stated state
+            area = bisect.bisect_left(self.zips, zip_code - zip_code % 100)
+            if (area < len(self.zips) and self.zips[area] // 100 == zip_code // 100
+                    and self.zip_state(area) == state_code):
+                return AMBIGUOUS
+            return IMPOSSIBLE
+
+        if state_code is not None and state_code not in self.zip_states(row):
+            return IMPOSSIBLE
+        if state_code is not None and city and self.zip_has_city(row, city):
+            return CONSISTENT
+        return AMBIGUOUS
+
+    def check_address(self, address):
+        """Check a ('USA', state, city, postcode, street, number) usaddress tuple."""
+        country, state, city, postcode, street, number = address
+        return self.check(state, city, postcode)
+
+    def stats(self):
+        """Return the number of addresses given each verdict."""
+        with self.lock:
+            return {f'postal_{verdict}': total for verdict, total in self.verdicts.items()}
+
+    def close(self):
+        # The array views must be released before the map can close
+        for view in (self.zips, self.city_offsets, self.city_hashes, self.extra_zips, self.states, self.extra_states):
+            view.release()
+        self.buffer.close()
+
+
+def load_postal_index(path=POSTAL_INDEX_PATH):
+    """Return the postal index at path, or None if it is missing so every address goes to the geocoder."""
+    if not os.path.exists(path):
+        print(f"No postal index at {path}, every address is sent to the geocoder")
+        return None
+    return PostalIndex(path)
+
+
+def build_postal_index(records, path=POSTAL_INDEX_PATH, zip_states=None):
+    """Write the index file from (zip code, state code, city names) records.
+
+    zip_states maps ZIP codes to every state they cross, the states other than the main one of the record are
+    stored as extra states.
+    """
+    zip_states = zip_states or {}
+    state_codes = sorted({state for _, state, _ in records}.union(*zip_states.values()))
+    state_ids = {state: index for index, state in enumerate(state_codes)}
+    zips, offsets, hashes, states = array('I'), array('I', [0]), array('I'), bytearray()
+    extra_zips, extra_states = array('I'), bytearray()
+    for zip_code, state, cities in sorted(records):
+        zips.append(zip_code)
+        hashes.extend(sorted({city_hash(city) for city in cities}))
+        offsets.append(len(hashes))
+        states.append(state_ids[state])
+        for extra_state in sorted(zip_states.get(zip_code, set()) - {state}):
+            extra_zips.append(zip_code)
+            extra_states.append(state_ids[extra_state])
+
+    states_table = ','.join(state_codes).encode('ascii')
+    with open(path + '.tmp', 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(zips), len(hashes), len(extra_zips), len(states_table)))
+        for part in (zips, offsets, hashes, extra_zips):
+            file.write(part.tobytes())  # Little-endian on every platform the crawler runs on
+        file.write(states)
+        file.write(extra_states)
+        file.write(states_table)
+    os.replace(path + '.tmp', path)
+
+
+def read_zipcodes_data(path):
+    """Return (zip code, state code, city names) records from the zips.json.bz2 file of the zipcodes package."""
+    records = []
+    for entry in json.load(bz2.open(path)):
+        state = normalize_state(entry['state'])
+        if state is None:
+            continue  # Military and territory ZIPs other than Puerto Rico
+        records.append((int(entry['zip_code']), state, [entry['city']] + entry['acceptable_cities']))
+    return records
+
+
+def read_zcta_states(path):
+    """Return ZIP code -> states from the Census ZCTA to county relationship file (tab20_zcta520_county20_natl.txt).
+
+    The zipcodes data gives each ZIP one state, the counties of a ZCTA tell the few that cross state lines.
+    """
+    zip_states = {}
+    with open(path, encoding='utf-8-sig') as file:
+        header = file.readline().rstrip('\n').split('|')
+        zcta_column, county_column = header.index('GEOID_ZCTA5_20'), header.index('GEOID_COUNTY_20')
+        for line in file:
+            fields = line.rstrip('\n').split('|')
+            zcta, state = fields[zcta_column], STATE_FIPS.get(fields[county_column][:2])
+            if zcta and state:
+                zip_states.setdefault(int(zcta), set()).add(state)
+    return {zip_code: states for zip_code, states in zip_states.items() if len(states) > 1}
+
+
+if __name__ == "__main__":
+    # python challenge_1/postal_index.py path/to/zipcodes/zips.json.bz2 [output path] [ZCTA to county relationship file]
+    records = read_zipcodes_data(sys.argv[1])
+    output_path = sys.argv[2] if len(sys.argv) > 2 else POSTAL_INDEX_PATH
+    zip_states = read_zcta_states(sys.argv[3]) if len(sys.argv) > 3 else {}
+    build_postal_index(records, output_path, zip_states)
+    print(f"Wrote {len(records)} ZIP codes, {len(zip_states)} crossing state lines, to {output_path} "
+          f"({os.path.getsize(output_path):,} bytes)")
@@ -0,0 +1,93 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+PROGRESS_INTERVAL = 5  # Seconds between two progress lines
+
+STATUS_LABELS = {'Reachable': 'reachable', 'Unreachable': 'unreachable', 'Reachable - No Addresses': 'no address',
+                 'Budget Exhausted': 'out of time'}
+
+
+def is_validated(result):
+    """Return True if the result is a reachable site with at least one validated address."""
+    return result['Status'] == 'Reachable' and result.get('Validated with GeoPy', 'Not validated') != 'Not validated'
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h{minutes:02d}m' if hours else f'{minutes}m{seconds:02d}s'
+
+
+class RunStats:
+    """Counts of the results of a run, updated in O(1) per result instead of rescanning the results."""
+
+    def __init__(self, total=None):
+        self.total = total  # Domains the run is expected to finish, resumed ones included
+        self.statuses = Counter()
+        self.run_statuses = Counter()  # Statuses of the results finished in this run, for the rates
+        self.validated = 0
+        self.results = 0
+        self.resumed = 0  # Results loaded from an earlier run, left out of the rates
+        self.started_domains = 0  # Domains taken by the crawl in this run
+        self.started = time.monotonic()
+
+    def add(self, result, resumed=False):
+        """Count a finished result."""
+        self.statuses[result['Status']] += 1
+        if not resumed:
+            self.run_statuses[result['Status']] += 1
+        self.validated += is_validated(result)
+        self.results += 1
+        self.resumed += resumed
+
+    def domain_started(self):
+        """Count a domain taken by the crawl, it is in flight until its result is added."""
+        self.started_domains += 1
+
+    @property
+    def in_flight(self):
+        return self.started_domains - (self.results - self.resumed)
+
+    def count(self, status):
+        return self.statuses[status]
+
+    def percentage(self, count):
+        return count / self.results * 100 if self.results else 0.0
+
+    def progress_line(self):
+        """Return a one-line view of the run: progress, throughput, ETA, in-flight domains and rates per status."""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        finished = self.results - self.resumed
+        rate = finished / elapsed
+        done = f'{self.results:,}/{self.total:,} ({self.results / self.total:.1%})' if self.total else f'{self.results:,}'
+        eta = format_duration((self.total - self.results) / rate) if self.total and rate else '?'
+        status_rates = ', '.join(f'{STATUS_LABELS.get(status, status)} {total / elapsed:.2f}/s'
+                                 for status, total in sorted(self.run_statuses.items()))
+        return (f"[{format_duration(elapsed)}] {done} domains | {rate:.2f} domains/s | ETA {eta} | "
+                f"in flight {self.in_flight} | {status_rates} | validated {self.percentage(self.validated):.1f}%")
+
+
+class ProgressLine:
+    """Prints the progress line of a run every interval seconds from a background thread, while in use."""
+
+    def __init__(self, stats, interval=PROGRESS_INTERVAL, stream=None):
+        self.stats = stats
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='progress', daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            print(self.stats.progress_line(), file=self.stream, flush=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        print(self.stats.progress_line(), file=self.stream, flush=True)
@@ -0,0 +1,66 @@
+import glob
+import hashlib
+import os
+import re
+
+from .checkpoint_store import load_results
+
+
+def shard_of(domain, shard_count):
+    """Return the shard a domain belongs to, the same on every machine and every run."""
+    # Python's hash() is salted per process, a digest keeps the partition stable across workers
+    digest = hashlib.blake2b(domain.strip().lower().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+
+def shard_domains(domains, shard_index, shard_count):
+    """Return the domains of one shard, in their original order, lazily so the domain list can be streamed."""
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} is outside 0..{shard_count - 1}")
+    if shard_count == 1:
+        return iter(domains)
+    return (domain for domain in domains if shard_of(domain, shard_count) == shard_index)
+
+
+def shard_path(path, shard_index, shard_count):
+    """Return the per-shard variant of an output path, e.g. results_checkpoint.shard-03-of-16.jsonl."""
+    if path is None or shard_count == 1:
+        return path
+    root, extension = os.path.splitext(path)
+    return f'{root}.shard-{shard_index:02d}-of-{shard_count:02d}{extension}'
+
+
+def find_shards(path, shard_count=None):
+    """Return shard index -> path of the shard files of an output path, and the shard count they were made with."""
+    root, extension = os.path.splitext(path)
+    pattern = re.compile(re.escape(root) + r'\.shard-(\d+)-of-(\d+)' + re.escape(extension) + '$')
+    shards, counts = {}, set()
+    for candidate in glob.glob(glob.escape(root) + '.shard-*' + extension):
+        match = pattern.match(candidate)
+        if match and (shard_count is None or int(match.group(2)) == shard_count):
+            shards[int(match.group(1))] = candidate
+            counts.add(int(match.group(2)))
+    if len(counts) > 1:
+        raise ValueError(f"Shards of {path} were made with different shard counts {sorted(counts)}, pass the count to merge")
+    return shards, counts.pop() if counts else shard_count
+
+
+def merge_shard_results(path, shard_count=None):
+    """Return the result records of every shard of a checkpoint path, one per domain.
+
+    Missing shards are reported so they can be rerun on their own, the merge goes on with the shards present.
+    """
+    shards, shard_count = find_shards(path, shard_count)
+    if not shards:
+        raise FileNotFoundError(f"No shards of {path} found")
+    missing = sorted(set(range(shard_count)) - set(shards))
+    if missing:
+        print(f"Missing shards {missing} of {shard_count}, rerun them and merge again")
+
+    results = {}
+    for shard_index in sorted(shards):
+        for result in load_results(shards[shard_index]):
+            # A domain rerun in a later attempt of its shard keeps its latest record
+            results[result['Domain']] = result
+    print(f"Merged {len(results)} domains from {len(shards)} of {shard_count} shards")
+    return list(results.values())
@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+from urllib.parse import urlparse
+
+MIN_FINGERPRINT_TEXT = 200  # Characters of landing page text needed to fingerprint it, near-empty pages all look alike
+
+
+def site_key(url):
+    """Return the host a URL lands on, without www., and its path and query unless it lands on the root page.
+
+    Shared platforms (site builders, social pages, link pages, parked-domain landers) host many companies on one
+    host, told apart by the path or the query only.
+    """
+    parsed = urlparse(url)
+    key = 'host:' + parsed.netloc.lower().removeprefix('www.')
+    path = parsed.path.rstrip('/')
+    if path:
+        key += path
+    if parsed.query:
+        key += '?' + parsed.query
+    return key
+
+
+def page_fingerprint(text):
+    """Return a fingerprint of the visible text of a landing page, or None if there is too little text to tell."""
+    normalized = ' '.join(text.split()).lower()
+    if len(normalized) < MIN_FINGERPRINT_TEXT:
+        return None
+    return 'text:' + hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class CrawledSite:
+    """A site crawled, or being crawled, for one domain, shared by the domains landing on the same site."""
+
+    def __init__(self, website):
+        self.website = website  # Domain whose crawl the other domains reuse
+        self.addresses = asyncio.get_running_loop().create_future()  # (pyap hits, validated, out of time) or None
+
+    @property
+    def failed(self):
+        """True once the crawl ended without getting through."""
+        return self.addresses.done() and self.addresses.result() is None
+
+    def finish(self, addresses):
+        """Hand the crawl outcome to the aliases waiting on it, None if the site could not be crawled."""
+        if not self.addresses.done():
+            self.addresses.set_result(addresses)
+
+
+class SiteRegistry:
+    """Final hosts and landing page fingerprints of the sites of a run, so each site is crawled once."""
+
+    def __init__(self):
+        self.sites = {}  # Host or fingerprint key -> CrawledSite
+
+    def find(self, *keys):
+        """Return the site already known under any of the keys, or None."""
+        for key in keys:
+            if key is not None and key in self.sites:
+                return self.sites[key]
+        return None
+
+    def claim(self, website, *keys):
+        """Register a new site crawled for the website under the keys."""
+        site = CrawledSite(website)
+        self.add_keys(site, *keys)
+        return site
+
+    def add_keys(self, site, *keys):
+        for key in keys:
+            # A failed crawl gives way, so the next crawl of that site is shared again
+            if key is not None and (key not in self.sites or self.sites[key].failed):
+                self.sites[key] = site
@@ -0,0 +1,42 @@
+import re
+from functools import lru_cache
+
+KEPT_PUNCTUATION = ",.;:!?"
+
+# ASCII bytes clean_website_content drops, deleted in one bytes.translate pass over the UTF-8 text.
+# Multi-byte UTF-8 sequences only use bytes >= 0x80, so non-ASCII characters are never touched by it
+DROPPED_ASCII = bytes(c for c in range(128) if not (chr(c).isalnum() or chr(c).isspace() or chr(c) in KEPT_PUNCTUATION))
+
+# Runs of non-ASCII characters in the UTF-8 text, the only part still checked character by character
+NON_ASCII_RUN = re.compile(rb'[\x80-\xff]+')
+
+
+@lru_cache(maxsize=4096)
+def alphanumeric_part(run):
+    """Return the alphanumeric characters of a run of UTF-8 encoded non-ASCII characters."""
+    run = run.decode('utf-8', 'surrogatepass')
+    return ''.join(c for c in run if c.isalnum()).encode('utf-8', 'surrogatepass')
+
+
+def keep_alphanumeric(match):
+    # The same few symbols come back all over a site, most runs are answered from the cache
+    return alphanumeric_part(match.group())
+
+
+def clean_website_content(text):
+    """Clean website content by removing extra spaces and normalizing text.
+
+    Accepts the whole text or a list of page texts, which are cleaned as if joined by whitespace.
+    """
+    if text is None:
+        return text
+    chunks = [text] if isinstance(text, str) else text
+
+    # Remove extra whitespace, page by page, without building the joined text first
+    cleaned_text = ' '.join(chunk_text for chunk in chunks if (chunk_text := ' '.join(chunk.split())))
+
+    # Remove non-alphanumeric characters, keeping basic punctuation
+    encoded = cleaned_text.encode('utf-8', 'surrogatepass').translate(None, DROPPED_ASCII)
+    if not cleaned_text.isascii():
+        encoded = NON_ASCII_RUN.sub(keep_alphanumeric, encoded)
+    return encoded.decode('utf-8', 'surrogatepass')